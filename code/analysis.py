@@ -13,6 +13,9 @@ from scipy import stats
 from sklearn.preprocessing import StandardScaler
 from sklearn.decomposition import PCA
 
+from sqlite_store import aggregate_question
+from rating_encoding import encode_ratings, SLIDER_QUESTIONS, LIKERT_QUESTIONS, CLOSED_DEMOGRAPHIC_ITEMS, SEEN_NOT_ANSWERED
+
 def descriptive_statistics(df):
     """
     Generate descriptive statistics for the dataset.
@@ -29,6 +32,34 @@ def descriptive_statistics(df):
     # - Narrative perception measures
     pass
 
+def video_rating_means(source, questions, filters=None):
+    """
+    Mean rating per video for numeric questions (e.g. tension_beginning/middle/end).
+    
+    Args:
+        source (pd.DataFrame or str): Cleaned long-format data, or the path of the
+            SQLite database written by data_cleaning.py (filters and averages are
+            then computed in SQL, so the full sample never has to be loaded)
+        questions (list): Numeric question names
+        filters (dict): Optional {column: value or [values]} restriction
+        
+    Returns:
+        pd.DataFrame: One row per video, one column per question
+    """
+    if isinstance(source, pd.DataFrame):
+        df = source
+        for col, value in (filters or {}).items():
+            values = value if isinstance(value, (list, tuple)) else [value]
+            df = df[df[col].astype(str).isin([str(v) for v in values])]
+        numeric = df[questions].apply(pd.to_numeric, errors='coerce')
+        return numeric.groupby(df['video_id']).mean()
+    
+    means = {}
+    for question in questions:
+        result = aggregate_question(source, question, agg='avg', filters=filters, group_by=['video_id'])
+        means[question] = result.set_index('video_id')['avg']
+    return pd.DataFrame(means)
+
 def narrative_perception_analysis(df):
     """
     Analyze narrative perception patterns across videos and participants.
@@ -45,21 +76,54 @@ def narrative_perception_analysis(df):
     # - Cross-video comparison
     pass
 
-def demographic_analysis(df):
+def demographic_analysis(schema, measures=None, min_group_size=5, demographics=None):
     """
     Analyze how demographics relate to narrative perceptions.
     
+    Ratings are averaged per participant on the response table, then joined to the
+    participant table once, so each demographic comparison runs over one row per
+    participant.
+    
     Args:
-        df (pd.DataFrame): Cleaned dataset
+        schema (StarSchema): Cleaned participant and response tables
+        measures (list): Rating items to compare (defaults to tension sliders and Likert items)
+        min_group_size (int): Groups with fewer participants are left out of the tests
+        demographics (list): Single-choice participant items to group by (defaults to
+            CLOSED_DEMOGRAPHIC_ITEMS; free-text and multi-select answers do not form groups)
         
     Returns:
-        dict: Demographic analysis results
+        dict: Per demographic variable, the group distribution, per-group means and
+            Kruskal-Wallis tests of each measure across groups
     """
-    # TODO: Implement demographic analysis
-    # - Age group differences
-    # - Gender differences
-    # - Other demographic factors
-    pass
+    measures = measures or SLIDER_QUESTIONS + LIKERT_QUESTIONS
+    ratings = encode_ratings(schema.responses.reindex(columns=measures), include_timing=False)
+    participant_means = schema.participant_means(ratings)
+    
+    demographics = [col for col in (demographics or CLOSED_DEMOGRAPHIC_ITEMS) if col in schema.participants.columns]
+    joined = schema.participant_attributes(demographics).set_index('ResponseId').join(participant_means, how='inner')
+    
+    results = {}
+    for demographic in demographics:
+        groups = joined[demographic].astype('string').str.strip()
+        groups = groups.where((groups != '') & (groups != SEEN_NOT_ANSWERED))
+        distribution = groups.value_counts()
+        testable = distribution[distribution >= min_group_size].index
+        
+        tests = {}
+        for measure in measures:
+            samples = [values.dropna().to_numpy() for _, values in joined.loc[groups.isin(testable), measure].groupby(groups)]
+            samples = [sample for sample in samples if len(sample) > 0]
+            if len(samples) >= 2:
+                statistic, p_value = stats.kruskal(*samples)
+                tests[measure] = {'H': statistic, 'p_value': p_value, 'n_groups': len(samples)}
+        
+        results[demographic] = {
+            'distribution': distribution.to_dict(),
+            'group_means': joined[measures].groupby(groups).mean(),
+            'tests': pd.DataFrame(tests).T
+        }
+    
+    return results
 
 def video_clustering_analysis(df):
     """
@@ -6,8 +6,9 @@ This script processes raw Qualtrics survey data and transforms it from wide to l
 for analysis. It handles:
 1. Removal of duplicate header rows
 2. Filtering out preview/test responses
-3. Wide-to-long transformation based on experimental design
-4. Data quality checks and validation
+3. Flagging participants who took the study more than once
+4. Wide-to-long transformation based on experimental design
+5. Data quality checks and validation
 
 Author: Generated for Short Form Video Narrative Analysis Project
 Date: 2025
@@ -19,10 +20,16 @@ import re
 import os
 from pathlib import Path
 import logging
-from typing import Dict, List, Tuple, Optional
+from typing import Dict, List, Tuple, Optional, Union, IO
 import warnings
 warnings.filterwarnings('ignore')
 
+from duplicate_detection import DuplicateParticipantDetector
+from missingness_index import MissingnessIndex
+from star_schema import StarSchema
+from response_screening import ResponseQualityScreener
+from sqlite_store import write_cleaned_database
+
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -45,6 +52,13 @@ class VideoNarrativeDataCleaner:
         self.raw_data = None
         self.cleaned_data = None
         self.long_data = None
+        self.clip_columns = {}
+        self.raw_columns = []
+        self.clip_responses = None
+        self.duplicate_flags = None
+        self.missingness_index = None
+        self.clip_quality_scores = None
+        self.quality_flags = None
         
         # Video IDs extracted from column names (these represent the 40 video clips)
         self.video_ids = self._extract_video_ids()
@@ -58,7 +72,7 @@ class VideoNarrativeDataCleaner:
         Video IDs follow the pattern N_Reso_clip where N is the clip number
         """
         if not self.data_path.exists():
-            logger.error(f"Data file not found: {self.data_path}")
+            logger.warning(f"Data file not found: {self.data_path} (video IDs will be taken from the loaded data)")
             return []
             
         # Read just the header row to extract video IDs
@@ -131,21 +145,94 @@ class VideoNarrativeDataCleaner:
             'comments_purpose_text': 'FutBhvr_whycomment_7_TEXT'
         }
     
-    def load_raw_data(self) -> pd.DataFrame:
+    def _clip_column_index(self, columns: List[str]) -> Dict[str, Tuple[str, str]]:
+        """
+        Map raw per-clip column names ({clip}_{suffix}) to (video_id, standardized question)
+        """
+        suffix_to_question = {suffix: name for name, suffix in self.question_mappings.items()}
+        clip_columns = {}
+        
+        for col in columns:
+            match = re.match(r'^(\d+)_(.+)$', col)
+            if match and match.group(2) in suffix_to_question:
+                clip_columns[col] = (f"clip_{match.group(1)}", suffix_to_question[match.group(2)])
+        
+        return clip_columns
+    
+    def _extract_clip_responses(self, chunk: pd.DataFrame, clip_columns: Dict[str, Tuple[str, str]]) -> pd.DataFrame:
+        """
+        Convert the per-clip block of a chunk into (row, video_id, question, value) triples,
+        keeping only items that were actually answered
+        """
+        values = chunk[list(clip_columns)].to_numpy(dtype=object)
+        # Answered cells in row-major order (same order as DataFrame.stack, on any pandas version)
+        rows, positions = np.nonzero(pd.notna(values))
+        
+        video_lookup = np.array([clip_columns[col][0] for col in clip_columns], dtype=object)
+        question_lookup = np.array([clip_columns[col][1] for col in clip_columns], dtype=object)
+        
+        return pd.DataFrame({
+            'row': chunk.index.to_numpy()[rows],
+            'video_id': video_lookup[positions],
+            'question': question_lookup[positions],
+            'value': values[rows, positions]
+        })
+    
+    def load_raw_data(self, chunksize: int = 5000, source: Optional[Union[str, Path, IO]] = None) -> pd.DataFrame:
         """
         Load and perform initial cleaning of raw data
+        
+        The ~1,100 per-clip columns are mostly empty (each participant sees only 4 of the 40 clips),
+        so they are not kept as dense columns. Each chunk is split into participant-level columns
+        (kept in `raw_data`) and answered clip items (kept as triples in `clip_responses`), so memory
+        grows with answered items rather than with the size of the clip catalog.
+        
+        Args:
+            chunksize: Number of raw rows parsed at a time
+            source: File path or binary stream to read instead of `data_path`
+                (e.g. an export being downloaded, see qualtrics_fetcher.py)
         """
-        logger.info(f"Loading data from {self.data_path}")
+        source = source if source is not None else self.data_path
+        logger.info(f"Loading data from {source if isinstance(source, (str, Path)) else 'stream'}")
         
         try:
             # Read the CSV file, skipping the second row (descriptive headers)
-            self.raw_data = pd.read_csv(self.data_path, skiprows=[1])
-            
-            logger.info(f"Loaded {len(self.raw_data)} rows and {len(self.raw_data.columns)} columns")
+            reader = pd.read_csv(source, skiprows=[1], dtype=str, chunksize=chunksize, encoding='utf-8-sig')
+            
+            participant_chunks = []
+            clip_chunks = []
+            clip_columns = None
+            raw_columns = []
+            
+            for chunk in reader:
+                if clip_columns is None:
+                    raw_columns = list(chunk.columns)
+                    clip_columns = self._clip_column_index(raw_columns)
+                
+                participant_chunks.append(chunk.drop(columns=list(clip_columns)))
+                clip_chunks.append(self._extract_clip_responses(chunk, clip_columns))
+            
+            self.clip_columns = clip_columns
+            self.raw_columns = raw_columns
+            if not self.video_ids:
+                self.video_ids = sorted({video_id for video_id, _ in clip_columns.values()})
+            self.raw_data = pd.concat(participant_chunks)
+            self.clip_responses = pd.concat(clip_chunks, ignore_index=True)
+            self.clip_responses['video_id'] = pd.Categorical(
+                self.clip_responses['video_id'], categories=sorted({v for v, _ in clip_columns.values()}))
+            self.clip_responses['question'] = pd.Categorical(
+                self.clip_responses['question'], categories=[q for q in self.question_mappings
+                                                             if q in {q for _, q in clip_columns.values()}])
+            
+            logger.info(f"Loaded {len(self.raw_data)} rows and {len(raw_columns)} columns")
+            logger.info(f"Clip block: {len(self.clip_responses)} answered items "
+                        f"({len(self.clip_responses) / max(len(self.raw_data) * len(clip_columns), 1) * 100:.1f}% of "
+                        f"{len(clip_columns)} clip columns)")
             
             # Remove rows that are completely empty or contain only NaN values
             initial_rows = len(self.raw_data)
-            self.raw_data = self.raw_data.dropna(how='all')
+            answered_rows = self.raw_data.index.isin(self.clip_responses['row'])
+            self.raw_data = self.raw_data[self.raw_data.notna().any(axis=1) | answered_rows]
             removed_empty = initial_rows - len(self.raw_data)
             
             if removed_empty > 0:
@@ -212,6 +299,11 @@ class VideoNarrativeDataCleaner:
             self.cleaned_data = self.cleaned_data[valid_id_mask]
             logger.info(f"Removed {len(self.raw_data) - valid_id_mask.sum()} responses with invalid ResponseId")
         
+        # Keep only the clip answers of retained participants, labelled with their ResponseId
+        self.clip_responses = self.clip_responses[self.clip_responses['row'].isin(self.cleaned_data.index)].copy()
+        if 'ResponseId' in self.cleaned_data.columns:
+            self.clip_responses['ResponseId'] = self.clip_responses['row'].map(self.cleaned_data['ResponseId'])
+        
         final_rows = len(self.cleaned_data)
         removed_total = initial_rows - final_rows
         
@@ -219,6 +311,60 @@ class VideoNarrativeDataCleaner:
         
         return self.cleaned_data
     
+    def flag_duplicate_participants(self, detector: Optional[DuplicateParticipantDetector] = None,
+                                    previous_exports: Optional[List[pd.DataFrame]] = None) -> pd.DataFrame:
+        """
+        Flag participants who appear to have taken the study more than once
+        
+        Args:
+            detector: Configured detector (defaults to DuplicateParticipantDetector())
+            previous_exports: Earlier exports/waves to check against, either participant-level
+                data or (participants, clip responses) pairs; the saved `{prefix}_participants.csv`
+                and `{prefix}_responses.csv` tables can be passed as they are
+        """
+        if self.cleaned_data is None:
+            raise ValueError("Cleaned data not available. Run filtering first.")
+        
+        logger.info("Flagging suspected duplicate participants...")
+        
+        detector = detector or DuplicateParticipantDetector()
+        for i, export in enumerate(previous_exports or []):
+            wide, clips = export if isinstance(export, tuple) else (export, None)
+            detector.add_responses(wide, source=f"previous_{i + 1}", clip_responses=clips)
+        detector.add_responses(self.cleaned_data, source=self.data_path.name,
+                               clip_responses=self.clip_responses)
+        
+        flags = detector.detect()
+        
+        # Keep only the rows belonging to the current export
+        self.duplicate_flags = flags[flags['ResponseId'].isin(self.cleaned_data['ResponseId'])]
+        summary = detector.summarize(self.duplicate_flags)
+        logger.info(f"Suspected duplicates in current export: {summary['suspected_duplicates']} "
+                    f"in {summary['duplicate_clusters']} clusters")
+        
+        return self.duplicate_flags
+    
+    def screen_response_quality(self, screener: Optional[ResponseQualityScreener] = None) -> pd.DataFrame:
+        """
+        Score every viewed clip for speeding (per-clip dwell time) and inattention (straight-lining,
+        invariant tension sliders) and flag participants. Flagged participants are kept; use
+        ResponseQualityScreener.exclude() to filter them.
+        
+        Args:
+            screener: Configured screener (defaults to ResponseQualityScreener())
+        
+        Returns:
+            pd.DataFrame: One row per participant with aggregated scores and speeder/inattentive flags
+        """
+        if self.clip_responses is None or 'ResponseId' not in self.clip_responses.columns:
+            raise ValueError("Clip responses not available. Run filtering first.")
+        
+        logger.info("Screening response quality...")
+        screener = screener or ResponseQualityScreener()
+        self.clip_quality_scores, self.quality_flags = screener.screen(self.get_viewed_clip_responses())
+        
+        return self.quality_flags
+    
     def transform_to_long_format(self) -> pd.DataFrame:
         """
         Transform data from wide format (one row per participant) to long format (one row per participant-video combination)
@@ -246,105 +392,176 @@ class VideoNarrativeDataCleaner:
         available_base_columns = [col for col in base_columns if col in self.cleaned_data.columns]
         available_demo_columns = [col for col in demo_columns if col in self.cleaned_data.columns]
         
-        # Create list to store long format dataframes
-        long_dataframes = []
-        
+        # Clips and questions in catalog order (videos with no columns in the export are skipped)
+        present_videos = {video_id for video_id, _ in self.clip_columns.values()}
+        video_ids = [video_id for video_id in self.video_ids if video_id in present_videos]
         for video_id in self.video_ids:
-            logger.info(f"Processing video: {video_id}")
-            
-            # Extract clip number from video_id (e.g., "clip_1" -> "1")
-            clip_num = video_id.replace('clip_', '')
-            
-            # Find all columns related to this video (start with clip number + underscore)
-            video_columns = [col for col in self.cleaned_data.columns if col.startswith(f"{clip_num}_")]
-            
-            if not video_columns:
-                logger.warning(f"No columns found for video {video_id} (looking for {clip_num}_*)")
-                continue
-            
-            # Create a subset dataframe for this video
-            video_data = self.cleaned_data[available_base_columns + video_columns + available_demo_columns].copy()
-            
-            # Add video identifier
-            video_data['video_id'] = video_id
-            
-            # Rename columns to standardized names
-            video_data = self._standardize_video_columns(video_data, video_id)
-            
-            long_dataframes.append(video_data)
+            if video_id not in present_videos:
+                logger.warning(f"No columns found for video {video_id}")
+        
+        present_questions = {question for _, question in self.clip_columns.values()}
+        questions = [q for q in self.question_mappings if q in present_questions]
         
-        # Combine all video dataframes
-        if long_dataframes:
-            self.long_data = pd.concat(long_dataframes, ignore_index=True, sort=False)
-            logger.info(f"Long format transformation complete: {len(self.long_data)} rows")
-        else:
+        if not video_ids:
             logger.error("No video data found for transformation")
             self.long_data = pd.DataFrame()
+            return self.long_data
+        
+        # One row per participant-video combination, video-major as in the original layout
+        n_participants = len(self.cleaned_data)
+        participant_pos = pd.Series(np.arange(n_participants), index=self.cleaned_data.index)
+        video_pos = pd.Series(np.arange(len(video_ids)), index=video_ids)
+        question_pos = pd.Series(np.arange(len(questions)), index=questions)
+        
+        # Scatter the answered items into the dense question block
+        responses = self.clip_responses[self.clip_responses['video_id'].isin(video_ids) &
+                                        self.clip_responses['question'].isin(questions)]
+        row_pos = (video_pos[responses['video_id'].astype(str)].to_numpy() * n_participants +
+                   participant_pos[responses['row']].to_numpy())
+        col_pos = question_pos[responses['question'].astype(str)].to_numpy()
+        
+        question_block = np.full((n_participants * len(video_ids), len(questions)), np.nan, dtype=object)
+        question_block[row_pos, col_pos] = responses['value'].to_numpy()
+        
+        repeated = np.tile(np.arange(n_participants), len(video_ids))
+        self.long_data = pd.concat([
+            self.cleaned_data[available_base_columns].iloc[repeated].reset_index(drop=True),
+            pd.DataFrame(question_block, columns=questions),
+            self.cleaned_data[available_demo_columns].iloc[repeated].reset_index(drop=True),
+            pd.DataFrame({'video_id': np.repeat(video_ids, n_participants)})
+        ], axis=1)
+        
+        logger.info(f"Long format transformation complete: {len(self.long_data)} rows")
         
         return self.long_data
     
-    def _standardize_video_columns(self, video_data: pd.DataFrame, video_id: str) -> pd.DataFrame:
+    def get_viewed_clip_responses(self) -> pd.DataFrame:
         """
-        Standardize column names for a specific video block
+        Return the clip block with one row per clip a participant actually answered
+        (ResponseId, video_id and one column per standardized question)
         """
-        # Extract clip number from video_id (e.g., "clip_1" -> "1")
-        clip_num = video_id.replace('clip_', '')
+        if self.clip_responses is None:
+            raise ValueError("Clip responses not available. Call load_raw_data() first.")
         
-        # Create mapping from actual column names to standardized names
-        column_mapping = {}
+        items = self.clip_responses
+        questions = list(items['question'].cat.categories)
         
-        for standardized_name, question_suffix in self.question_mappings.items():
-            # Create the expected column name for this clip
-            expected_col = f"{clip_num}_{question_suffix}"
-            
-            # Find matching column (case-insensitive)
-            matching_cols = [col for col in video_data.columns if col == expected_col]
-            
-            if matching_cols:
-                # Take the first matching column
-                column_mapping[matching_cols[0]] = standardized_name
-            else:
-                logger.warning(f"No column found for: {expected_col} (standardized: {standardized_name})")
+        viewings, viewing_pos = np.unique(
+            np.column_stack([items['row'].to_numpy(), items['video_id'].cat.codes.to_numpy()]),
+            axis=0, return_inverse=True)
+        block = np.full((len(viewings), len(questions)), np.nan, dtype=object)
+        block[viewing_pos.ravel(), items['question'].cat.codes.to_numpy()] = items['value'].to_numpy()
+        
+        responses = pd.DataFrame(block, columns=questions)
+        responses.insert(0, 'video_id', items['video_id'].cat.categories[viewings[:, 1]])
+        responses.insert(0, 'ResponseId', pd.Series(viewings[:, 0]).map(
+            items.drop_duplicates('row').set_index('row')['ResponseId']).to_numpy())
+        
+        return responses
+    
+    def build_star_schema(self) -> StarSchema:
+        """
+        Split the cleaned data into a participant dimension (one row per ResponseId), a response
+        fact table (one row per viewed clip) and the clip catalog
+        """
+        if self.cleaned_data is None:
+            raise ValueError("Cleaned data not available. Run filtering first.")
+        
+        responses = self.get_viewed_clip_responses()
+        viewers = responses['video_id'].value_counts()
+        catalog = self.video_ids or sorted(viewers.index)
+        videos = pd.DataFrame({
+            'video_id': catalog,
+            'n_viewers': viewers.reindex(catalog, fill_value=0).to_numpy()
+        })
+        
+        return StarSchema(self.cleaned_data, responses, videos)
+    
+    def reconstruct_wide_data(self) -> pd.DataFrame:
+        """
+        Rebuild the dense wide layout (one {clip}_{suffix} column per clip question) from the
+        participant-level columns and the answered clip items, in the raw export's column order
+        """
+        if self.cleaned_data is None:
+            raise ValueError("Cleaned data not available. Run filtering first.")
         
-        # Apply the column mapping
-        video_data = video_data.rename(columns=column_mapping)
+        raw_names = {value: col for col, value in self.clip_columns.items()}
+        items = self.clip_responses
+        keys = pd.Series(list(zip(items['video_id'].astype(str), items['question'].astype(str))), index=items.index)
         
-        return video_data
+        clip_block = pd.DataFrame({'row': items['row'], 'column': keys.map(raw_names), 'value': items['value']})
+        clip_block = clip_block.pivot(index='row', columns='column', values='value')
+        clip_block = clip_block.reindex(index=self.cleaned_data.index, columns=list(self.clip_columns))
+        
+        wide = pd.concat([self.cleaned_data, clip_block], axis=1)
+        # Columns added during cleaning (if any) follow the raw export's columns
+        return wide[self.raw_columns + [col for col in wide.columns if col not in set(self.raw_columns)]]
+    
+    def build_missingness_index(self) -> MissingnessIndex:
+        """
+        Build the item nonresponse index (one answered-items bitmask per viewed participant-video row)
+        over the per-clip questions and the demographic block
+        """
+        if self.clip_responses is None or 'ResponseId' not in self.clip_responses.columns:
+            raise ValueError("Clip responses not available. Run filtering first.")
+        
+        self.missingness_index = MissingnessIndex.from_clip_responses(
+            self.clip_responses, self.cleaned_data, list(self.question_mappings))
+        return self.missingness_index
     
-    def validate_data_quality(self) -> Dict[str, any]:
+    def validate_data_quality(self, schema: Optional[StarSchema] = None) -> Dict[str, any]:
         """
         Perform data quality checks and return validation results
+        
+        The checks run on the star schema tables, so the dense long format is not needed.
+        Total observations count every participant-video combination (the long format row count).
+        
+        Args:
+            schema: Star schema of the cleaned data (built from the cleaned data when omitted)
         """
-        if self.long_data is None:
-            raise ValueError("Long format data not available. Run transformation first.")
+        if self.cleaned_data is None:
+            raise ValueError("Cleaned data not available. Run filtering first.")
         
         logger.info("Performing data quality validation...")
         
+        schema = schema or self.build_star_schema()
+        participants, responses = schema.participants, schema.responses
+        n_videos = len({video_id for video_id, _ in self.clip_columns.values()})
+        
         validation_results = {
-            'total_observations': len(self.long_data),
-            'unique_participants': self.long_data['ResponseId'].nunique() if 'ResponseId' in self.long_data.columns else 0,
-            'unique_videos': self.long_data['video_id'].nunique() if 'video_id' in self.long_data.columns else 0,
+            'total_observations': len(participants) * n_videos,
+            'unique_participants': participants['ResponseId'].nunique() if 'ResponseId' in participants.columns else 0,
+            'unique_videos': n_videos,
             'missing_data_summary': {},
             'response_distribution': {},
             'quality_issues': []
         }
         
         # Check for missing data in key columns
-        key_columns = ['video_id', 'ResponseId']
-        if 'ResponseId' in self.long_data.columns:
-            for col in key_columns:
-                if col in self.long_data.columns:
-                    missing_count = self.long_data[col].isna().sum()
-                    validation_results['missing_data_summary'][col] = {
-                        'missing_count': int(missing_count),
-                        'missing_percentage': float(missing_count / len(self.long_data) * 100)
-                    }
+        if 'ResponseId' in participants.columns:
+            for col, table in (('video_id', responses), ('ResponseId', participants)):
+                missing_count = table[col].isna().sum()
+                validation_results['missing_data_summary'][col] = {
+                    'missing_count': int(missing_count),
+                    'missing_percentage': float(missing_count / max(len(table), 1) * 100)
+                }
+        
+        # Item-level nonresponse among viewed clips, from the answered-items bitmasks
+        if self.clip_responses is not None and 'ResponseId' in self.clip_responses.columns:
+            index = self.build_missingness_index()
+            validation_results['item_nonresponse'] = index.summary()
+            
+            clip_items = list(self.question_mappings)
+            mostly_skipped = int((index.missing_counts(clip_items) > len(clip_items) / 2).sum())
+            if mostly_skipped > 0:
+                validation_results['quality_issues'].append(
+                    f"Found {mostly_skipped} viewed clips with more than half of the clip items skipped")
         
         # Check response distributions for key questions
         response_questions = ['familiarity_plot', 'clear_starting_point', 'logical_flow']
         for question in response_questions:
-            if question in self.long_data.columns:
-                validation_results['response_distribution'][question] = self.long_data[question].value_counts().to_dict()
+            if question in responses.columns:
+                validation_results['response_distribution'][question] = responses[question].value_counts().to_dict()
         
         # Identify potential quality issues
         if validation_results['unique_participants'] == 0:
@@ -353,9 +570,28 @@ class VideoNarrativeDataCleaner:
         if validation_results['unique_videos'] < 10:
             validation_results['quality_issues'].append(f"Very few videos found: {validation_results['unique_videos']}")
         
+        # Check for participants suspected of taking the study more than once
+        if self.duplicate_flags is not None:
+            n_suspected = int(self.duplicate_flags['suspected_duplicate'].sum())
+            validation_results['suspected_duplicate_participants'] = n_suspected
+            if n_suspected > 0:
+                validation_results['quality_issues'].append(f"Found {n_suspected} suspected duplicate participants")
+        
+        # Check for speeders and inattentive responders
+        if self.quality_flags is not None:
+            n_speeders = int(self.quality_flags['speeder'].sum())
+            n_inattentive = int(self.quality_flags['inattentive'].sum())
+            validation_results['speeders'] = n_speeders
+            validation_results['inattentive_participants'] = n_inattentive
+            if n_speeders > 0:
+                validation_results['quality_issues'].append(f"Found {n_speeders} speeders (fast per-clip dwell times)")
+            if n_inattentive > 0:
+                validation_results['quality_issues'].append(
+                    f"Found {n_inattentive} inattentive participants (straight-lining or invariant sliders)")
+        
         # Check for duplicate participant-video combinations
-        if 'ResponseId' in self.long_data.columns and 'video_id' in self.long_data.columns:
-            duplicates = self.long_data.duplicated(subset=['ResponseId', 'video_id']).sum()
+        if 'ResponseId' in responses.columns:
+            duplicates = responses.duplicated(subset=['ResponseId', 'video_id']).sum()
             if duplicates > 0:
                 validation_results['quality_issues'].append(f"Found {duplicates} duplicate participant-video combinations")
         
@@ -363,11 +599,18 @@ class VideoNarrativeDataCleaner:
         
         return validation_results
     
-    def save_cleaned_data(self, filename_prefix: str = "cleaned_data") -> Dict[str, str]:
+    def save_cleaned_data(self, filename_prefix: str = "cleaned_data", sqlite: bool = False,
+                          long_format: bool = True) -> Dict[str, str]:
         """
         Save cleaned data in multiple formats
+        
+        Args:
+            filename_prefix: Prefix for the saved output files
+            sqlite: Also write responses, participants and the codebook to an indexed SQLite database
+            long_format: Also write the denormalized long format file (participant columns repeated
+                on every participant-video row); the star schema tables hold the same data
         """
-        if self.long_data is None:
+        if self.cleaned_data is None:
             raise ValueError("No cleaned data to save. Run cleaning pipeline first.")
         
         logger.info("Saving cleaned data...")
@@ -377,21 +620,27 @@ class VideoNarrativeDataCleaner:
         
         saved_files = {}
         
-        # Save long format data (main output)
-        long_file = self.output_dir / f"{filename_prefix}_long_format.csv"
-        self.long_data.to_csv(long_file, index=False)
-        saved_files['long_format'] = str(long_file)
-        logger.info(f"Saved long format data: {long_file}")
-        
-        # Save cleaned wide format data
-        if self.cleaned_data is not None:
-            wide_file = self.output_dir / f"{filename_prefix}_wide_format.csv"
-            self.cleaned_data.to_csv(wide_file, index=False)
-            saved_files['wide_format'] = str(wide_file)
-            logger.info(f"Saved wide format data: {wide_file}")
+        # Save the star schema: participant dimension, response fact table and clip catalog
+        # (the dense wide layout can be rebuilt with reconstruct_wide_data())
+        schema = self.build_star_schema()
+        saved_files.update(schema.save(self.output_dir, filename_prefix))
+        logger.info(f"Saved star schema: {len(schema.participants)} participants, "
+                    f"{len(schema.responses)} viewed clip responses, {len(schema.videos)} videos")
+        
+        # Save denormalized long format data
+        if long_format:
+            if self.long_data is None:
+                self.transform_to_long_format()
+            long_file = self.output_dir / f"{filename_prefix}_long_format.csv"
+            # Write a temporary file and swap it in, so readers such as the query service never see a partial file
+            temp_file = long_file.with_name(long_file.name + '.tmp')
+            self.long_data.to_csv(temp_file, index=False)
+            os.replace(temp_file, long_file)
+            saved_files['long_format'] = str(long_file)
+            logger.info(f"Saved long format data: {long_file}")
         
         # Save data quality report
-        validation_results = self.validate_data_quality()
+        validation_results = self.validate_data_quality(schema)
         report_file = self.output_dir / f"{filename_prefix}_quality_report.txt"
         with open(report_file, 'w') as f:
             f.write("DATA QUALITY REPORT\n")
@@ -404,6 +653,16 @@ class VideoNarrativeDataCleaner:
             for col, info in validation_results['missing_data_summary'].items():
                 f.write(f"  {col}: {info['missing_count']} ({info['missing_percentage']:.1f}%)\n")
             
+            if 'item_nonresponse' in validation_results:
+                nonresponse = validation_results['item_nonresponse']
+                f.write(f"\nItem Nonresponse ({nonresponse['rows']} viewed clips, "
+                        f"{nonresponse['complete_rows']} complete, {nonresponse['distinct_patterns']} patterns):\n")
+                for item, info in nonresponse['item_missing'].items():
+                    f.write(f"  {item}: {info['missing_count']} ({info['missing_percentage']:.1f}%)\n")
+                f.write("Most common missingness patterns:\n")
+                for pattern in nonresponse['top_patterns']:
+                    f.write(f"  {pattern['n_rows']} rows missing: {pattern['missing_items'] or '(none)'}\n")
+            
             f.write("\nQuality Issues:\n")
             for issue in validation_results['quality_issues']:
                 f.write(f"  - {issue}\n")
@@ -411,26 +670,63 @@ class VideoNarrativeDataCleaner:
         saved_files['quality_report'] = str(report_file)
         logger.info(f"Saved quality report: {report_file}")
         
+        # Save duplicate participant flags
+        if self.duplicate_flags is not None:
+            duplicates_file = self.output_dir / f"{filename_prefix}_duplicate_flags.csv"
+            self.duplicate_flags.to_csv(duplicates_file, index=False)
+            saved_files['duplicate_flags'] = str(duplicates_file)
+            logger.info(f"Saved duplicate participant flags: {duplicates_file}")
+        
+        # Save response quality flags
+        if self.quality_flags is not None:
+            flags_file = self.output_dir / f"{filename_prefix}_quality_flags.csv"
+            self.quality_flags.to_csv(flags_file, index=False)
+            saved_files['quality_flags'] = str(flags_file)
+            logger.info(f"Saved response quality flags: {flags_file}")
+        
+        # Save indexed SQLite database
+        if sqlite:
+            db_file = self.output_dir / f"{filename_prefix}.sqlite"
+            write_cleaned_database(db_file, self.clip_responses, self.cleaned_data, self.question_mappings)
+            saved_files['sqlite'] = str(db_file)
+            logger.info(f"Saved SQLite database: {db_file}")
+        
         return saved_files
     
-    def run_full_pipeline(self, filename_prefix: str = "cleaned_data") -> Dict[str, str]:
+    def run_full_pipeline(self, filename_prefix: str = "cleaned_data",
+                          source: Optional[Union[str, Path, IO]] = None, sqlite: bool = False,
+                          long_format: bool = True) -> Dict[str, str]:
         """
         Run the complete data cleaning pipeline
+        
+        Args:
+            filename_prefix: Prefix for the saved output files
+            source: File path or binary stream to read instead of `data_path`
+            sqlite: Also write an indexed SQLite database of the cleaned data
+            long_format: Build and write the denormalized long format file; when False the
+                dense participant × video block is never built
         """
         logger.info("Starting full data cleaning pipeline...")
         
         try:
             # Step 1: Load raw data
-            self.load_raw_data()
+            self.load_raw_data(source=source)
             
             # Step 2: Filter preview responses
             self.filter_preview_responses()
             
-            # Step 3: Transform to long format
-            self.transform_to_long_format()
+            # Step 3: Flag suspected duplicate participants
+            self.flag_duplicate_participants()
+            
+            # Step 4: Screen for speeders and inattentive responders
+            self.screen_response_quality()
+            
+            # Step 5: Transform to long format (only needed for the long format file)
+            if long_format:
+                self.transform_to_long_format()
             
-            # Step 4: Save cleaned data
-            saved_files = self.save_cleaned_data(filename_prefix)
+            # Step 6: Save cleaned data
+            saved_files = self.save_cleaned_data(filename_prefix, sqlite=sqlite, long_format=long_format)
             
             logger.info("Data cleaning pipeline completed successfully!")
             
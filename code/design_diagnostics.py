@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+Design Diagnostics for Short Form Video Narrative Perception Study
+
+This module checks the health of the randomized clip assignment. It builds the
+participant × clip incidence matrix as a sparse matrix and derives from it:
+1. Clip exposure counts and exposure imbalance statistics
+2. Clip-pair co-occurrence from a single sparse product (X^T X)
+3. Presentation position/order balance (when display order is available)
+4. Alerts when the design drifts away from the intended allocation
+
+Everything is computed from the sparse matrix without densifying the
+clip × clip table, so it can be re-run during fielding on large samples.
+
+Author: Generated for Short Form Video Narrative Analysis Project
+Date: 2025
+"""
+
+import pandas as pd
+import numpy as np
+import logging
+from typing import Dict, List, Optional
+from scipy import sparse
+from scipy import stats
+
+logger = logging.getLogger(__name__)
+
+
+class DesignDiagnostics:
+    """
+    Sparse participant × clip incidence and the randomization checks derived from it
+    """
+
+    def __init__(self, clips_per_participant: int = 4, exposure_tolerance: float = 0.5,
+                 alpha: float = 0.01):
+        """
+        Initialize the diagnostics
+
+        Args:
+            clips_per_participant: Number of clips each participant should rate
+            exposure_tolerance: Relative deviation from the expected exposure that triggers an alert
+            alpha: Significance level for the uniformity/balance tests
+        """
+        self.clips_per_participant = clips_per_participant
+        self.exposure_tolerance = exposure_tolerance
+        self.alpha = alpha
+
+        self.incidence = None
+        self.participants = None
+        self.clips = None
+
+    def build_incidence(self, df: pd.DataFrame, clip_catalog: Optional[List[str]] = None) -> sparse.csr_matrix:
+        """
+        Build the participant × clip incidence matrix from rated participant-video rows
+
+        Args:
+            df: Rows with ResponseId and video_id, one per clip a participant rated
+            clip_catalog: Full list of clips (so never-shown clips are counted as zero exposure)
+
+        Returns:
+            sparse.csr_matrix: Binary incidence matrix
+        """
+        pairs = df[['ResponseId', 'video_id']].dropna().drop_duplicates()
+
+        participant_codes, self.participants = pd.factorize(pairs['ResponseId'])
+        if clip_catalog is not None:
+            self.clips = pd.Index(clip_catalog)
+            clip_codes = self.clips.get_indexer(pairs['video_id'])
+            if (clip_codes < 0).any():
+                raise ValueError("Found video_id values that are not in the clip catalog")
+        else:
+            clip_codes, self.clips = pd.factorize(pairs['video_id'], sort=True)
+
+        self.incidence = sparse.csr_matrix(
+            (np.ones(len(pairs), dtype=np.int32), (participant_codes, clip_codes)),
+            shape=(len(self.participants), len(self.clips)))
+
+        logger.info(f"Incidence matrix: {self.incidence.shape[0]} participants × {self.incidence.shape[1]} clips, "
+                    f"{self.incidence.nnz} ratings")
+        return self.incidence
+
+    def exposure_statistics(self) -> Dict[str, any]:
+        """
+        Clip exposure counts, participant load and imbalance statistics
+        """
+        if self.incidence is None:
+            raise ValueError("Incidence matrix not built. Call build_incidence() first.")
+
+        exposures = np.asarray(self.incidence.sum(axis=0)).ravel()
+        load = np.asarray(self.incidence.sum(axis=1)).ravel()
+        expected = exposures.sum() / len(exposures) if len(exposures) else 0.0
+
+        chi2, p_value = stats.chisquare(exposures) if exposures.sum() > 0 else (np.nan, np.nan)
+        deviation = (exposures - expected) / expected if expected > 0 else np.zeros_like(exposures, dtype=float)
+
+        return {
+            'exposure_per_clip': pd.Series(exposures, index=self.clips),
+            'expected_exposure': float(expected),
+            'exposure_min': int(exposures.min()) if len(exposures) else 0,
+            'exposure_max': int(exposures.max()) if len(exposures) else 0,
+            'exposure_mean': float(exposures.mean()) if len(exposures) else 0.0,
+            'exposure_std': float(exposures.std(ddof=1)) if len(exposures) > 1 else 0.0,
+            'exposure_cv': float(exposures.std(ddof=1) / expected) if expected > 0 and len(exposures) > 1 else 0.0,
+            'max_min_ratio': float(exposures.max() / exposures.min()) if len(exposures) and exposures.min() > 0 else np.inf,
+            'uniformity_chi2': float(chi2),
+            'uniformity_p_value': float(p_value),
+            'under_exposed_clips': list(self.clips[deviation < -self.exposure_tolerance]),
+            'over_exposed_clips': list(self.clips[deviation > self.exposure_tolerance]),
+            'clips_per_participant': pd.Series(load).value_counts().sort_index().to_dict(),
+            'participants_off_design': int((load != self.clips_per_participant).sum())
+        }
+
+    def co_occurrence(self) -> sparse.csr_matrix:
+        """
+        Clip × clip co-occurrence counts (diagonal holds each clip's exposure)
+        """
+        if self.incidence is None:
+            raise ValueError("Incidence matrix not built. Call build_incidence() first.")
+
+        incidence = self.incidence.tocsc()
+        return (incidence.T @ incidence).tocsr()
+
+    def pair_balance_statistics(self, co_occurrence: Optional[sparse.csr_matrix] = None) -> Dict[str, any]:
+        """
+        Summarize how evenly clip pairs are shown together
+
+        Statistics over the m(m-1)/2 distinct pairs are computed from the non-zero
+        entries only; pairs that never co-occur are counted analytically.
+        """
+        co_occurrence = co_occurrence if co_occurrence is not None else self.co_occurrence()
+        n_clips = co_occurrence.shape[0]
+        n_pairs = n_clips * (n_clips - 1) // 2
+        if n_pairs == 0:
+            return {'n_pairs': 0}
+
+        upper = sparse.triu(co_occurrence, k=1).tocoo()
+        counts = upper.data.astype(float)
+
+        # Under random k-of-m assignment each pair is shown together n*k(k-1)/(m(m-1)) times
+        load = np.asarray(self.incidence.sum(axis=1)).ravel()
+        expected = float((load * (load - 1)).sum() / (n_clips * (n_clips - 1)))
+
+        total = counts.sum()
+        mean = total / n_pairs
+        variance = (np.square(counts).sum() / n_pairs) - mean ** 2
+
+        top = np.argsort(counts)[::-1][:10]
+        return {
+            'n_pairs': n_pairs,
+            'expected_pair_count': expected,
+            'pair_count_mean': float(mean),
+            'pair_count_std': float(np.sqrt(max(variance, 0.0))),
+            'pair_count_max': int(counts.max()) if len(counts) else 0,
+            'pairs_never_shown_together': int(n_pairs - len(counts)),
+            'pairs_never_shown_rate': float((n_pairs - len(counts)) / n_pairs),
+            'most_frequent_pairs': [(self.clips[upper.row[i]], self.clips[upper.col[i]], int(counts[i])) for i in top]
+        }
+
+    def position_balance_statistics(self, df: pd.DataFrame, position_col: str = 'display_position') -> Dict[str, any]:
+        """
+        Test whether clips appear equally often in each presentation position
+
+        Args:
+            df: Rows with video_id and a presentation position column
+            position_col: Column holding the position (1..k) at which the clip was shown
+        """
+        if position_col not in df.columns:
+            logger.warning(f"No '{position_col}' column; position balance cannot be assessed")
+            return {'available': False}
+
+        rows = df[['video_id', position_col]].dropna()
+        clip_codes = self.clips.get_indexer(rows['video_id'])
+        position_codes, positions = pd.factorize(rows[position_col], sort=True)
+
+        table = sparse.coo_matrix(
+            (np.ones(len(rows)), (clip_codes, position_codes)),
+            shape=(len(self.clips), len(positions))).toarray()
+
+        # Drop clips that were never shown before testing independence
+        table = table[table.sum(axis=1) > 0]
+        chi2, p_value, dof, _ = stats.chi2_contingency(table)
+
+        return {
+            'available': True,
+            'positions': list(positions),
+            'count_per_position': dict(zip(positions, table.sum(axis=0).astype(int))),
+            'position_chi2': float(chi2),
+            'position_dof': int(dof),
+            'position_p_value': float(p_value)
+        }
+
+    def alerts(self, exposure: Dict[str, any], pairs: Dict[str, any],
+               positions: Optional[Dict[str, any]] = None) -> List[str]:
+        """
+        Turn diagnostics into human-readable alerts
+        """
+        alerts = []
+
+        if exposure['participants_off_design'] > 0:
+            alerts.append(f"{exposure['participants_off_design']} participants did not rate exactly "
+                          f"{self.clips_per_participant} clips")
+        if exposure['uniformity_p_value'] < self.alpha:
+            alerts.append(f"Clip exposure deviates from uniform (chi2={exposure['uniformity_chi2']:.1f}, "
+                          f"p={exposure['uniformity_p_value']:.3g})")
+        if exposure['under_exposed_clips']:
+            alerts.append(f"{len(exposure['under_exposed_clips'])} clips under-exposed by more than "
+                          f"{self.exposure_tolerance:.0%}: {exposure['under_exposed_clips'][:5]}")
+        if exposure['over_exposed_clips']:
+            alerts.append(f"{len(exposure['over_exposed_clips'])} clips over-exposed by more than "
+                          f"{self.exposure_tolerance:.0%}: {exposure['over_exposed_clips'][:5]}")
+        if pairs.get('expected_pair_count', 0) >= 1 and pairs['pairs_never_shown_rate'] > 0.5:
+            alerts.append(f"{pairs['pairs_never_shown_rate']:.0%} of clip pairs were never shown together")
+        if positions and positions.get('available') and positions['position_p_value'] < self.alpha:
+            alerts.append(f"Clip order is unbalanced across positions (p={positions['position_p_value']:.3g})")
+
+        return alerts
+
+    def run(self, df: pd.DataFrame, clip_catalog: Optional[List[str]] = None,
+            position_col: str = 'display_position') -> Dict[str, any]:
+        """
+        Build the incidence matrix and run all diagnostics
+
+        Args:
+            df: Rated participant-video rows (ResponseId, video_id, optional position column)
+            clip_catalog: Full list of clips in the study
+            position_col: Column holding presentation position, if exported
+
+        Returns:
+            dict: Exposure, pair-balance and position-balance statistics plus alerts
+        """
+        logger.info("Running design diagnostics...")
+
+        self.build_incidence(df, clip_catalog)
+        exposure = self.exposure_statistics()
+        pairs = self.pair_balance_statistics()
+        positions = self.position_balance_statistics(df, position_col) if position_col in df.columns else {'available': False}
+
+        results = {
+            'n_participants': self.incidence.shape[0],
+            'n_clips': self.incidence.shape[1],
+            'n_ratings': int(self.incidence.nnz),
+            'exposure': exposure,
+            'pairs': pairs,
+            'positions': positions,
+            'alerts': self.alerts(exposure, pairs, positions)
+        }
+
+        for alert in results['alerts']:
+            logger.warning(f"Design alert: {alert}")
+
+        return results
@@ -0,0 +1,392 @@
+#!/usr/bin/env python3
+"""
+Duplicate Participant Detection for Short Form Video Narrative Perception Study
+
+This module flags respondents who appear to have taken the study more than once,
+within a single Qualtrics export or across several exports/waves. It combines
+three signals, each indexed so that detection stays near-linear in the number of
+responses instead of comparing every pair of respondents:
+1. Exact IP address matches (hash index via groupby)
+2. Nearby geolocations (KD-tree nearest-neighbour lookup)
+3. Near-identical participant-level answers (MinHash signatures with LSH banding,
+   verified by exact Jaccard similarity)
+
+Answer vectors are built from the participant-level block (Pre_*, Demo_* and
+their free-text fields). The per-clip answers cannot be used directly: each
+take shows a random 4 of the 40 clips, so two takes by the same person rarely
+share clips. Where linked responses do share clips, the agreement of their
+answers on those clips is reported alongside the flags.
+
+Responses are only flagged, never dropped; the decision to exclude is left to
+the analyst.
+
+Author: Generated for Short Form Video Narrative Analysis Project
+Date: 2025
+"""
+
+import pandas as pd
+import numpy as np
+import logging
+from typing import Dict, List, Optional
+from scipy.sparse import coo_matrix, csr_matrix
+from scipy.sparse.csgraph import connected_components
+from scipy.spatial import cKDTree
+
+from rating_encoding import SEEN_NOT_ANSWERED
+
+logger = logging.getLogger(__name__)
+
+# Mean Earth radius used to convert kilometres to chord distance on the unit sphere
+EARTH_RADIUS_KM = 6371.0
+
+# Large prime for the universal hash family used by MinHash (2^61 - 1)
+MINHASH_PRIME = np.uint64((1 << 61) - 1)
+
+# Prefixes of the participant-level answer columns that make up an answer vector
+# (the pre-survey and demographic blocks, including their free-text fields)
+ANSWER_PREFIXES = ('Pre_', 'Demo_')
+
+
+def clip_items(clip_responses: pd.DataFrame) -> pd.DataFrame:
+    """
+    Answered clip items as (ResponseId, video_id, question, value) rows
+
+    Accepts the items already in that form or a per-viewed-clip table with one
+    column per question, which is melted and stripped of unanswered cells.
+    """
+    keys = ['ResponseId', 'video_id']
+    if {'question', 'value'}.issubset(clip_responses.columns):
+        return clip_responses[keys + ['question', 'value']]
+
+    items = clip_responses.melt(id_vars=keys, var_name='question', value_name='value')
+    return items.dropna(subset=['value']).reset_index(drop=True)
+
+
+class DuplicateParticipantDetector:
+    """
+    Index-based detector for participants who completed the study more than once
+    """
+
+    def __init__(self, geo_radius_km: float = 1.0, num_perm: int = 64, bands: int = 16,
+                 similarity_threshold: float = 0.8, max_bucket_size: int = 1000,
+                 seed: int = 42):
+        """
+        Initialize the detector
+
+        Args:
+            geo_radius_km: Maximum distance between two geolocations to count as "nearby"
+            num_perm: Number of MinHash permutations per answer vector
+            bands: Number of LSH bands (must divide num_perm)
+            similarity_threshold: Minimum Jaccard similarity of participant-level answer sets;
+                with the ~12 answers of the Pre_*/Demo_* block, 0.8 tolerates one changed answer
+            max_bucket_size: LSH buckets larger than this are ignored as uninformative
+            seed: Random seed for the MinHash hash family
+        """
+        if num_perm % bands != 0:
+            raise ValueError(f"num_perm ({num_perm}) must be divisible by bands ({bands})")
+
+        self.geo_radius_km = geo_radius_km
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows_per_band = num_perm // bands
+        self.similarity_threshold = similarity_threshold
+        self.max_bucket_size = max_bucket_size
+
+        rng = np.random.default_rng(seed)
+        self._hash_a = rng.integers(1, 1 << 31, size=num_perm, dtype=np.uint64)
+        self._hash_b = rng.integers(0, 1 << 31, size=num_perm, dtype=np.uint64)
+
+        self.responses = None
+        self.clip_responses = None
+
+    def add_responses(self, df: pd.DataFrame, source: Optional[str] = None,
+                      clip_responses: Optional[pd.DataFrame] = None) -> int:
+        """
+        Add responses from one export to the detector
+
+        Args:
+            df: Participant-level (wide) responses, one row per ResponseId
+            source: Label for the export/wave the rows came from
+            clip_responses: Answered clip items, either as (ResponseId, video_id, question, value)
+                rows or as one row per viewed clip with a column per question (the saved
+                `{prefix}_responses.csv` table)
+
+        Returns:
+            int: Number of responses currently held by the detector
+        """
+        batch = df.copy()
+        batch['dedup_source'] = source if source is not None else f"export_{self._n_sources()}"
+
+        if self.responses is None:
+            self.responses = batch
+        else:
+            self.responses = pd.concat([self.responses, batch], ignore_index=True, sort=False)
+
+        # The same response can appear in overlapping exports; that is not a duplicate person
+        if 'ResponseId' in self.responses.columns:
+            self.responses = self.responses.drop_duplicates(subset=['ResponseId'], keep='first')
+        self.responses = self.responses.reset_index(drop=True)
+
+        if clip_responses is not None:
+            items = clip_items(clip_responses).astype(str)
+            self.clip_responses = items if self.clip_responses is None else pd.concat(
+                [self.clip_responses, items], ignore_index=True).drop_duplicates()
+
+        logger.info(f"Duplicate detector holds {len(self.responses)} responses")
+        return len(self.responses)
+
+    def _n_sources(self) -> int:
+        if self.responses is None:
+            return 0
+        return self.responses['dedup_source'].nunique()
+
+    def _answer_columns(self) -> List[str]:
+        """
+        Participant-level answer columns that make up a respondent's answer vector
+
+        Columns with the same answer for every response (e.g. a single-option item)
+        carry no information and are left out.
+        """
+        columns = [col for col in self.responses.columns if col.startswith(ANSWER_PREFIXES)]
+        return [col for col in columns if self.responses[col].nunique(dropna=True) > 1]
+
+    def _ip_edges(self) -> np.ndarray:
+        """
+        Link every response to the first response sharing its IP address
+        """
+        if 'IPAddress' not in self.responses.columns:
+            return np.empty((0, 2), dtype=np.int64)
+
+        ip = self.responses['IPAddress'].astype('string').str.strip()
+        codes, _ = pd.factorize(ip, use_na_sentinel=True)
+        valid = codes >= 0
+        idx = np.flatnonzero(valid)
+        if len(idx) == 0:
+            return np.empty((0, 2), dtype=np.int64)
+
+        # Anchor of each group is its first occurrence
+        first = pd.Series(idx).groupby(codes[valid]).transform('min').to_numpy()
+        mask = first != idx
+        return np.column_stack([first[mask], idx[mask]])
+
+    def _geo_coordinates(self) -> Optional[np.ndarray]:
+        """
+        Convert latitude/longitude to 3D points on the unit sphere
+        """
+        if not {'LocationLatitude', 'LocationLongitude'}.issubset(self.responses.columns):
+            return None
+
+        lat = np.radians(pd.to_numeric(self.responses['LocationLatitude'], errors='coerce').to_numpy(dtype=float))
+        lon = np.radians(pd.to_numeric(self.responses['LocationLongitude'], errors='coerce').to_numpy(dtype=float))
+        return np.column_stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+
+    def _geo_neighbors(self, coords: np.ndarray) -> pd.DataFrame:
+        """
+        Find each response's nearest other response within the geo radius
+        """
+        valid = ~np.isnan(coords).any(axis=1)
+        idx = np.flatnonzero(valid)
+        result = pd.DataFrame({'neighbor': -1, 'distance_km': np.nan}, index=range(len(coords)))
+        if len(idx) < 2:
+            return result
+
+        chord = 2 * np.sin(self.geo_radius_km / EARTH_RADIUS_KM / 2)
+        tree = cKDTree(coords[idx])
+        dist, nn = tree.query(coords[idx], k=2, distance_upper_bound=chord)
+
+        # Column 0 is the point itself; column 1 is its nearest other point (inf if none in range)
+        found = np.isfinite(dist[:, 1])
+        result.loc[idx[found], 'neighbor'] = idx[nn[found, 1]]
+        result.loc[idx[found], 'distance_km'] = 2 * EARTH_RADIUS_KM * np.arcsin(dist[found, 1] / 2)
+        return result
+
+    def _pair_distance_km(self, coords: np.ndarray, left: np.ndarray, right: np.ndarray) -> np.ndarray:
+        chord = np.linalg.norm(coords[left] - coords[right], axis=1)
+        return 2 * EARTH_RADIUS_KM * np.arcsin(np.clip(chord / 2, 0, 1))
+
+    def _answer_tokens(self):
+        """
+        (row, token hash) pairs of the answered participant-level items, sorted by row
+
+        Answers are compared case- and whitespace-insensitively so free-text fields
+        match across takes; blank and "seen but not answered" (-99) values are skipped.
+        """
+        columns = self._answer_columns()
+        if not columns:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.uint64)
+
+        melted = self.responses[columns].reset_index(drop=True).melt(ignore_index=False).dropna(subset=['value'])
+        text = melted['value'].astype(str).str.strip().str.lower()
+        answered = (text != '') & (text != SEEN_NOT_ANSWERED)
+
+        rows = melted.index.to_numpy()[answered.to_numpy()]
+        tokens = (melted['variable'].astype(str) + '=' + text)[answered].to_numpy(dtype=object)
+        token_hash = pd.util.hash_array(tokens) & np.uint64(0xFFFFFFFF)
+
+        order = np.argsort(rows, kind='stable')
+        return rows[order].astype(np.int64), token_hash[order]
+
+    def _minhash_signatures(self, rows: np.ndarray, token_hash: np.ndarray) -> np.ndarray:
+        """
+        Compute MinHash signatures over the set of (question, answer) tokens of each response
+        """
+        signatures = np.full((len(self.responses), self.num_perm), MINHASH_PRIME, dtype=np.uint64)
+        if len(rows) == 0:
+            return signatures
+
+        starts = np.flatnonzero(np.r_[True, rows[1:] != rows[:-1]])
+
+        for p in range(self.num_perm):
+            permuted = (self._hash_a[p] * token_hash + self._hash_b[p]) % MINHASH_PRIME
+            signatures[rows[starts], p] = np.minimum.reduceat(permuted, starts)
+
+        return signatures
+
+    def _lsh_edges(self, signatures: np.ndarray, rows: np.ndarray, token_hash: np.ndarray) -> np.ndarray:
+        """
+        Candidate pairs whose signatures collide in at least one LSH band, kept when
+        the exact Jaccard similarity of their answer sets reaches the threshold
+        """
+        edges = []
+        n = len(signatures)
+        for band in range(self.bands):
+            block = signatures[:, band * self.rows_per_band:(band + 1) * self.rows_per_band]
+            keys = pd.util.hash_pandas_object(pd.DataFrame(block), index=False).to_numpy()
+            codes, uniques = pd.factorize(keys)
+            sizes = np.bincount(codes, minlength=len(uniques))
+
+            member = (sizes[codes] > 1) & (sizes[codes] <= self.max_bucket_size)
+            idx = np.flatnonzero(member)
+            if len(idx) == 0:
+                continue
+            first = pd.Series(idx).groupby(codes[idx]).transform('min').to_numpy()
+            mask = first != idx
+            edges.append(np.column_stack([first[mask], idx[mask]]))
+
+        if not edges:
+            return np.empty((0, 2), dtype=np.int64)
+
+        edges = np.unique(np.vstack(edges), axis=0)
+        # Answer sets are short, so candidates are verified exactly rather than by signature agreement
+        similarity = self._jaccard(rows, token_hash, edges)
+        keep = similarity >= self.similarity_threshold
+        logger.info(f"LSH produced {len(edges)} candidate pairs, {keep.sum()} above similarity "
+                    f"{self.similarity_threshold} (n={n})")
+        return edges[keep]
+
+    def _jaccard(self, rows: np.ndarray, token_hash: np.ndarray, edges: np.ndarray) -> np.ndarray:
+        """
+        Exact Jaccard similarity of the answer sets of each pair of responses
+        """
+        token_codes, uniques = pd.factorize(token_hash)
+        incidence = csr_matrix((np.ones(len(rows)), (rows, token_codes)),
+                               shape=(len(self.responses), len(uniques)))
+        incidence.data[:] = 1
+        sizes = np.asarray(incidence.sum(axis=1)).ravel()
+
+        shared = np.asarray(incidence[edges[:, 0]].multiply(incidence[edges[:, 1]]).sum(axis=1)).ravel()
+        union = sizes[edges[:, 0]] + sizes[edges[:, 1]] - shared
+        return np.divide(shared, union, out=np.zeros(len(edges)), where=union > 0)
+
+    def _shared_clip_agreement(self, edges: np.ndarray) -> np.ndarray:
+        """
+        Share of identical answers on the clip items both responses of each pair answered
+        (NaN when the pair shares no answered clip item)
+        """
+        agreement = np.full(len(edges), np.nan)
+        if self.clip_responses is None or len(edges) == 0 or 'ResponseId' not in self.responses.columns:
+            return agreement
+
+        response_ids = self.responses['ResponseId'].astype(str).to_numpy()
+        pairs = pd.DataFrame({'pair': np.arange(len(edges)),
+                              'left': response_ids[edges[:, 0]], 'right': response_ids[edges[:, 1]]})
+        items = self.clip_responses
+        matched = (pairs.merge(items, left_on='left', right_on='ResponseId')
+                   .merge(items, left_on=['right', 'video_id', 'question'],
+                          right_on=['ResponseId', 'video_id', 'question'], suffixes=('_left', '_right')))
+        if matched.empty:
+            return agreement
+
+        same = (matched['value_left'].str.strip().str.lower() == matched['value_right'].str.strip().str.lower())
+        shared = same.groupby(matched['pair']).mean()
+        agreement[shared.index.to_numpy()] = shared.to_numpy()
+        return agreement
+
+    def detect(self) -> pd.DataFrame:
+        """
+        Run all indexes and return per-response duplicate flags
+
+        Returns:
+            pd.DataFrame: One row per response with ResponseId, source, per-signal flags,
+            `suspected_duplicate` and a `duplicate_cluster` id shared by linked responses
+        """
+        if self.responses is None or self.responses.empty:
+            raise ValueError("No responses loaded. Call add_responses() first.")
+
+        logger.info("Detecting duplicate participants...")
+        n = len(self.responses)
+
+        ip_edges = self._ip_edges()
+        ip_match = np.zeros(n, dtype=bool)
+        ip_match[ip_edges.ravel()] = True
+
+        coords = self._geo_coordinates()
+        if coords is not None:
+            geo = self._geo_neighbors(coords)
+            geo_match = geo['neighbor'].to_numpy() >= 0
+        else:
+            geo = pd.DataFrame({'neighbor': -1, 'distance_km': np.nan}, index=range(n))
+            geo_match = np.zeros(n, dtype=bool)
+
+        rows, token_hash = self._answer_tokens()
+        answer_edges = self._lsh_edges(self._minhash_signatures(rows, token_hash), rows, token_hash)
+        answer_match = np.zeros(n, dtype=bool)
+        answer_match[answer_edges.ravel()] = True
+
+        # Best clip-answer agreement with any answer-matched response (where they share clips)
+        agreement = pd.Series(np.tile(self._shared_clip_agreement(answer_edges), 2))
+        shared_clip_agreement = agreement.groupby(answer_edges.T.ravel()).max().reindex(range(n)).to_numpy()
+
+        # Similar answers alone can be coincidence on short blocks; require a location signal too
+        if coords is not None and len(answer_edges) > 0:
+            distance = self._pair_distance_km(coords, answer_edges[:, 0], answer_edges[:, 1])
+            confirmed = answer_edges[distance <= self.geo_radius_km]
+        else:
+            confirmed = np.empty((0, 2), dtype=np.int64)
+
+        edges = np.vstack([ip_edges, confirmed]).astype(np.int64)
+        graph = coo_matrix((np.ones(len(edges)), (edges[:, 0], edges[:, 1])), shape=(n, n))
+        _, labels = connected_components(graph, directed=False)
+        cluster_sizes = np.bincount(labels)
+        suspected = cluster_sizes[labels] > 1
+
+        flags = pd.DataFrame({
+            'ResponseId': self.responses['ResponseId'].to_numpy() if 'ResponseId' in self.responses.columns else np.arange(n),
+            'dedup_source': self.responses['dedup_source'].to_numpy(),
+            'ip_match': ip_match,
+            'geo_match': geo_match,
+            'nearest_geo_km': geo['distance_km'].to_numpy(),
+            'answer_match': answer_match,
+            'shared_clip_agreement': shared_clip_agreement,
+            'suspected_duplicate': suspected,
+            'duplicate_cluster': np.where(suspected, labels, -1)
+        })
+
+        logger.info(f"Flagged {int(suspected.sum())} suspected duplicate responses "
+                    f"({int(ip_match.sum())} IP, {int(geo_match.sum())} geo, {int(answer_match.sum())} answer matches)")
+
+        return flags
+
+    def summarize(self, flags: pd.DataFrame) -> Dict[str, int]:
+        """
+        Summarize detection results for reporting
+        """
+        clusters = flags.loc[flags['suspected_duplicate'], 'duplicate_cluster']
+        return {
+            'responses_checked': len(flags),
+            'suspected_duplicates': int(flags['suspected_duplicate'].sum()),
+            'duplicate_clusters': int(clusters.nunique()),
+            'ip_matches': int(flags['ip_match'].sum()),
+            'geo_matches': int(flags['geo_match'].sum()),
+            'answer_matches': int(flags['answer_match'].sum())
+        }
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Narrative Perception Factor Extraction for Short Form Video Narrative Perception Study
+
+This module extracts narrative perception factors (principal components of the
+per-clip ratings) with incremental PCA so the fit scales with the accumulated
+sample. It:
+1. Encodes ratings chunk by chunk and rescales every item to [0, 1] using its
+   fixed response scale (no data-dependent standardization, so earlier chunks
+   never need to be revisited)
+2. Updates the fit with each chunk (IncrementalPCA.partial_fit); memory depends
+   on the chunk size, not on the number of rating rows
+3. Saves and loads the fitted components so new responses can be added to an
+   existing fit instead of refitting from scratch
+
+Example:
+    model = NarrativeFactorModel(n_components=3)
+    model.fit_csv('video_narrative_cleaned_long_format.csv')
+    model.save('narrative_factors.npz')
+
+    model = NarrativeFactorModel.load('narrative_factors.npz')
+    model.partial_fit(new_long_rows)
+
+Author: Generated for Short Form Video Narrative Analysis Project
+Date: 2025
+"""
+
+import pandas as pd
+import numpy as np
+import logging
+from typing import Dict, List, Optional
+from sklearn.decomposition import IncrementalPCA
+
+from rating_encoding import encode_ratings, SLIDER_QUESTIONS, LIKERT_QUESTIONS
+
+logger = logging.getLogger(__name__)
+
+# Items entering the factor model; satisfactory_resolution is only asked after
+# narrative_resolution = Yes and would drop most rows from the complete cases
+FACTOR_ITEMS = (SLIDER_QUESTIONS
+                + [q for q in LIKERT_QUESTIONS if not q.startswith('familiarity_')]
+                + ['narrative_resolution', 'concluded_scene'])
+
+# (minimum, maximum) of each item's response scale, used to rescale to [0, 1]
+ITEM_RANGES = {
+    **{q: (0.0, 100.0) for q in SLIDER_QUESTIONS},
+    **{q: (1.0, 5.0) for q in LIKERT_QUESTIONS},
+    'narrative_resolution': (0.0, 1.0),
+    'concluded_scene': (0.0, 1.0)
+}
+
+# Fitted IncrementalPCA attributes persisted by save()
+_FITTED_ATTRIBUTES = ['components_', 'mean_', 'var_', 'singular_values_', 'explained_variance_',
+                      'explained_variance_ratio_', 'noise_variance_', 'n_samples_seen_']
+
+
+class NarrativeFactorModel:
+    """
+    Incremental PCA of per-clip narrative ratings
+    """
+
+    def __init__(self, n_components: int = 3, items: Optional[List[str]] = None, min_batch_size: int = 2000):
+        """
+        Initialize the factor model
+
+        Args:
+            n_components: Number of factors to extract
+            items: Rating items to include (defaults to FACTOR_ITEMS)
+            min_batch_size: Complete rows collected before each incremental update;
+                larger batches track the full-data PCA more closely
+        """
+        self.n_components = n_components
+        self.min_batch_size = max(min_batch_size, n_components)
+        self.items = list(items or FACTOR_ITEMS)
+        unknown = [item for item in self.items if item not in ITEM_RANGES]
+        if unknown:
+            raise ValueError(f"No response scale known for items: {unknown}")
+
+        self.pca = IncrementalPCA(n_components=n_components)
+        # Complete rows held back until there are enough for an update batch
+        self._pending = np.empty((0, len(self.items)), dtype=np.float64)
+
+    @property
+    def is_fitted(self) -> bool:
+        return hasattr(self.pca, 'components_')
+
+    @property
+    def n_samples_seen(self) -> int:
+        return int(self.pca.n_samples_seen_) if self.is_fitted else 0
+
+    def _scaled(self, df: pd.DataFrame) -> np.ndarray:
+        """
+        Encode the factor items of long-format rows and rescale them to [0, 1]
+        """
+        encoded = encode_ratings(df.reindex(columns=self.items), include_timing=False)
+        values = encoded.reindex(columns=self.items).to_numpy(dtype=np.float64)
+
+        lower = np.array([ITEM_RANGES[item][0] for item in self.items])
+        upper = np.array([ITEM_RANGES[item][1] for item in self.items])
+        return (values - lower) / (upper - lower)
+
+    def partial_fit(self, df: pd.DataFrame) -> int:
+        """
+        Update the fit with a chunk of long-format rows
+
+        Complete rows are buffered until min_batch_size of them are available;
+        call flush() to fit a remaining partial batch.
+
+        Args:
+            df: Long-format rows with the standardized question columns
+
+        Returns:
+            int: Number of complete rating rows taken from the chunk
+        """
+        values = self._scaled(df)
+        complete = values[~np.isnan(values).any(axis=1)]
+        batch = np.vstack([self._pending, complete])
+
+        if len(batch) < self.min_batch_size:
+            self._pending = batch
+        else:
+            self.pca.partial_fit(batch)
+            self._pending = batch[:0]
+        return len(complete)
+
+    def flush(self) -> int:
+        """
+        Fit any buffered rows (IncrementalPCA needs at least n_components of them)
+
+        Returns:
+            int: Number of rows fitted
+        """
+        if len(self._pending) < self.n_components:
+            return 0
+        n = len(self._pending)
+        self.pca.partial_fit(self._pending)
+        self._pending = self._pending[:0]
+        return n
+
+    def fit_csv(self, path: str, chunksize: int = 100000) -> 'NarrativeFactorModel':
+        """
+        Fit (or extend the fit) from a cleaned long-format CSV read in chunks
+
+        Args:
+            path: Path to the cleaned long-format CSV
+            chunksize: Rows per chunk; bounds memory use
+
+        Returns:
+            NarrativeFactorModel: self
+        """
+        logger.info(f"Fitting narrative factors from {path} in chunks of {chunksize}")
+        wanted = set(self.items)
+        for chunk in pd.read_csv(path, usecols=lambda col: col in wanted, dtype=str, chunksize=chunksize):
+            self.partial_fit(chunk)
+        self.flush()
+
+        logger.info(f"Narrative factor model fitted on {self.n_samples_seen} rating rows")
+        return self
+
+    def transform(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Factor scores for complete rating rows (index aligned to df)
+        """
+        self._check_fitted()
+        values = self._scaled(df)
+        complete = ~np.isnan(values).any(axis=1)
+        scores = self.pca.transform(values[complete])
+        return pd.DataFrame(scores, index=df.index[complete],
+                            columns=[f'factor_{i + 1}' for i in range(scores.shape[1])])
+
+    def loadings(self) -> pd.DataFrame:
+        """
+        Item × factor loadings (components scaled by the square root of explained variance)
+        """
+        self._check_fitted()
+        loadings = self.pca.components_.T * np.sqrt(self.pca.explained_variance_)
+        return pd.DataFrame(loadings, index=self.items,
+                            columns=[f'factor_{i + 1}' for i in range(loadings.shape[1])])
+
+    def summary(self) -> Dict[str, any]:
+        self._check_fitted()
+        return {
+            'n_samples_seen': self.n_samples_seen,
+            'items': self.items,
+            'explained_variance_ratio': self.pca.explained_variance_ratio_.tolist(),
+            'cumulative_explained_variance': float(self.pca.explained_variance_ratio_.sum())
+        }
+
+    def _check_fitted(self):
+        if not self.is_fitted:
+            raise ValueError("Factor model has not been fitted yet")
+
+    def save(self, path: str):
+        """
+        Persist items, fitted components, running statistics and buffered rows to .npz
+
+        A model that has only buffered rows so far (fewer than min_batch_size complete
+        rows added) is saved without fitted components, so the rows are not lost.
+        """
+        if not self.is_fitted and not len(self._pending):
+            raise ValueError("Factor model has not been fitted yet and has no buffered rows to save")
+        arrays = {attr: np.asarray(getattr(self.pca, attr)) for attr in _FITTED_ATTRIBUTES} if self.is_fitted else {}
+        np.savez_compressed(path, items=np.array(self.items), n_components=self.n_components,
+                            min_batch_size=self.min_batch_size, pending=self._pending, **arrays)
+        logger.info(f"Saved narrative factor model ({self.n_samples_seen} rows seen, "
+                    f"{len(self._pending)} buffered) to {path}")
+
+    @classmethod
+    def load(cls, path: str) -> 'NarrativeFactorModel':
+        """
+        Restore a saved model; further partial_fit() calls continue the same fit
+        """
+        with np.load(path, allow_pickle=False) as data:
+            model = cls(int(data['n_components']), data['items'].tolist(), int(data['min_batch_size']))
+            # Fitted attributes are absent when only buffered rows were saved
+            for attr in _FITTED_ATTRIBUTES:
+                if attr in data.files:
+                    value = data[attr]
+                    setattr(model.pca, attr, value if value.ndim else value.item())
+            model._pending = data['pending']
+
+        if model.is_fitted:
+            model.pca.n_components_ = model.pca.components_.shape[0]
+            model.pca.n_features_in_ = model.pca.components_.shape[1]
+        logger.info(f"Loaded narrative factor model ({model.n_samples_seen} rows seen, "
+                    f"{len(model._pending)} buffered) from {path}")
+        return model
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+Fielding Monitor for Short Form Video Narrative Perception Study
+
+This module keeps hourly and daily aggregates of incoming responses so that
+dashboards can be refreshed during fielding without re-aggregating the whole
+history. Each bucket tracks:
+1. Completion counts
+2. Session duration quantiles (fixed log-spaced histogram)
+3. Per-clip exposure counts
+4. Running means of key ratings (tension_beginning/middle/end)
+
+Adding a response touches one hourly and one daily bucket, so updates cost the
+same no matter how many responses have already been collected. Timestamps are
+parsed with the fixed Qualtrics export format.
+
+Author: Generated for Short Form Video Narrative Analysis Project
+Date: 2025
+"""
+
+import pandas as pd
+import numpy as np
+import logging
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Timestamp format of StartDate/EndDate/RecordedDate in Qualtrics CSV exports
+QUALTRICS_DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Ratings tracked with running means in every bucket
+KEY_RATINGS = ['tension_beginning', 'tension_middle', 'tension_end']
+
+# Session duration histogram: log-spaced edges from 1 second to ~11.5 days
+DURATION_BIN_EDGES = np.logspace(0, 6, 241)
+
+
+def parse_qualtrics_datetime(values: pd.Series) -> pd.Series:
+    """
+    Parse Qualtrics timestamps with the fixed export format (no per-value format inference)
+    """
+    return pd.to_datetime(values, format=QUALTRICS_DATETIME_FORMAT, errors='coerce')
+
+
+class _Bucket:
+    """
+    Mergeable aggregates for one time bucket
+    """
+
+    def __init__(self):
+        self.completions = 0
+        self.duration_hist = np.zeros(len(DURATION_BIN_EDGES) + 1, dtype=np.int64)
+        self.clip_exposure = Counter()
+        self.rating_sum = dict.fromkeys(KEY_RATINGS, 0.0)
+        self.rating_n = dict.fromkeys(KEY_RATINGS, 0)
+
+    def merge(self, other: '_Bucket'):
+        self.completions += other.completions
+        self.duration_hist += other.duration_hist
+        self.clip_exposure.update(other.clip_exposure)
+        for rating in KEY_RATINGS:
+            self.rating_sum[rating] += other.rating_sum[rating]
+            self.rating_n[rating] += other.rating_n[rating]
+
+    def duration_quantiles(self, quantiles=(0.1, 0.5, 0.9)) -> Dict[float, float]:
+        """
+        Approximate duration quantiles (seconds) from the histogram
+        """
+        total = self.duration_hist.sum()
+        if total == 0:
+            return {q: np.nan for q in quantiles}
+
+        cumulative = np.cumsum(self.duration_hist)
+        # Bin i covers [edges[i-1], edges[i]); use the geometric midpoint as its value
+        lower = np.r_[DURATION_BIN_EDGES[0], DURATION_BIN_EDGES]
+        upper = np.r_[DURATION_BIN_EDGES, DURATION_BIN_EDGES[-1]]
+        midpoints = np.sqrt(lower * upper)
+
+        return {q: float(midpoints[np.searchsorted(cumulative, q * total)]) for q in quantiles}
+
+    def rating_means(self) -> Dict[str, float]:
+        return {rating: self.rating_sum[rating] / self.rating_n[rating] if self.rating_n[rating] else np.nan
+                for rating in KEY_RATINGS}
+
+
+class FieldingMonitor:
+    """
+    Incrementally maintained hourly and daily fielding aggregates
+    """
+
+    FREQUENCIES = {'hourly': 'h', 'daily': 'D'}
+
+    def __init__(self, timestamp_col: str = 'EndDate'):
+        """
+        Initialize the monitor
+
+        Args:
+            timestamp_col: Column used as the completion time of a response
+        """
+        self.timestamp_col = timestamp_col
+        self.buckets = {name: {} for name in self.FREQUENCIES}
+        self.total = _Bucket()
+        self._seen = set()
+
+    def _bucket(self, frequency: str, key: pd.Timestamp) -> _Bucket:
+        buckets = self.buckets[frequency]
+        if key not in buckets:
+            buckets[key] = _Bucket()
+        return buckets[key]
+
+    def add_response(self, completed_at, duration_seconds: float, clips: List[str],
+                     ratings: Optional[List[Dict[str, float]]] = None, response_id: Optional[str] = None) -> bool:
+        """
+        Add one completed response (constant time in the size of the history)
+
+        Args:
+            completed_at: Completion timestamp (string in export format or Timestamp)
+            duration_seconds: Session duration
+            clips: video_ids rated in this response
+            ratings: One {rating: value} dict per rated clip
+            response_id: If given, repeated deliveries of the same response are ignored
+
+        Returns:
+            bool: Whether the response was counted
+        """
+        if response_id is not None:
+            if response_id in self._seen:
+                return False
+            self._seen.add(response_id)
+
+        if isinstance(completed_at, str):
+            completed_at = pd.Timestamp(datetime.strptime(completed_at, QUALTRICS_DATETIME_FORMAT))
+
+        update = _Bucket()
+        update.completions = 1
+        if duration_seconds is not None and not np.isnan(duration_seconds):
+            update.duration_hist[np.searchsorted(DURATION_BIN_EDGES, duration_seconds, side='right')] += 1
+        update.clip_exposure.update(clips)
+        for clip_ratings in ratings or []:
+            for rating in KEY_RATINGS:
+                value = clip_ratings.get(rating)
+                if value is not None and not np.isnan(value):
+                    update.rating_sum[rating] += value
+                    update.rating_n[rating] += 1
+
+        for frequency, code in self.FREQUENCIES.items():
+            self._bucket(frequency, completed_at.floor(code)).merge(update)
+        self.total.merge(update)
+        return True
+
+    def add_responses(self, df: pd.DataFrame, participants: Optional[pd.DataFrame] = None) -> int:
+        """
+        Add many responses at once from cleaned response rows (vectorized backfill)
+
+        Args:
+            df: Clip response rows with ResponseId, video_id and key ratings; rows without
+                answers are ignored
+            participants: Participant table with ResponseId, the timestamp column and
+                `Duration (in seconds)`. If omitted, these columns are read from df
+                (long-format rows, one participant's values repeated on each of its rows)
+
+        Returns:
+            int: Number of new responses added
+        """
+        answer_cols = [col for col in KEY_RATINGS + ['familiarity_plot'] if col in df.columns]
+        answered = df[df[answer_cols].notna().any(axis=1)] if answer_cols else df
+        answered = answered[~answered['ResponseId'].isin(self._seen)].copy()
+        if answered.empty:
+            return 0
+
+        if participants is None:
+            participants = answered[~answered['ResponseId'].duplicated()]
+        participants = participants[participants['ResponseId'].isin(answered['ResponseId'])].copy()
+
+        timestamps = participants[self.timestamp_col]
+        if not pd.api.types.is_datetime64_any_dtype(timestamps):
+            timestamps = parse_qualtrics_datetime(timestamps)
+        participants['_completed_at'] = timestamps
+        participants = participants[participants['_completed_at'].notna()]
+        answered['_completed_at'] = answered['ResponseId'].map(
+            participants.set_index('ResponseId')['_completed_at'])
+        answered = answered[answered['_completed_at'].notna()]
+
+        ratings = answered.reindex(columns=KEY_RATINGS).apply(pd.to_numeric, errors='coerce')
+        durations = pd.to_numeric(participants['Duration (in seconds)'], errors='coerce').to_numpy()
+        duration_bins = np.where(np.isnan(durations), -1, np.searchsorted(DURATION_BIN_EDGES, durations, side='right'))
+
+        for frequency, code in self.FREQUENCIES.items():
+            row_keys = answered['_completed_at'].dt.floor(code)
+            participant_keys = participants['_completed_at'].dt.floor(code)
+
+            completions = participant_keys.value_counts()
+            exposure = answered.groupby([row_keys, answered['video_id']]).size()
+            rating_sum = ratings.groupby(row_keys).sum()
+            rating_n = ratings.groupby(row_keys).count()
+            hist = pd.crosstab(participant_keys.to_numpy(), duration_bins)
+
+            for key, n in completions.items():
+                bucket = self._bucket(frequency, key)
+                bucket.completions += int(n)
+                if key in hist.index:
+                    for bin_index, count in hist.loc[key].items():
+                        if bin_index >= 0:
+                            bucket.duration_hist[bin_index] += int(count)
+            for (key, clip), n in exposure.items():
+                self._bucket(frequency, key).clip_exposure[clip] += int(n)
+            for key in rating_sum.index:
+                bucket = self._bucket(frequency, key)
+                for rating in KEY_RATINGS:
+                    bucket.rating_sum[rating] += float(rating_sum.at[key, rating])
+                    bucket.rating_n[rating] += int(rating_n.at[key, rating])
+
+        # Keep the all-time totals in step with the buckets
+        self.total.merge(self._summarize_new(participants, answered, ratings, duration_bins))
+
+        self._seen.update(participants['ResponseId'])
+        logger.info(f"Fielding monitor: added {len(participants)} responses")
+        return len(participants)
+
+    def _summarize_new(self, participants, answered, ratings, duration_bins) -> _Bucket:
+        bucket = _Bucket()
+        bucket.completions = len(participants)
+        valid = duration_bins >= 0
+        bucket.duration_hist += np.bincount(duration_bins[valid], minlength=len(bucket.duration_hist))
+        bucket.clip_exposure.update(answered['video_id'].value_counts().to_dict())
+        for rating in KEY_RATINGS:
+            bucket.rating_sum[rating] += float(ratings[rating].sum())
+            bucket.rating_n[rating] += int(ratings[rating].count())
+        return bucket
+
+    def rolling(self, end: Optional[pd.Timestamp] = None, hours: int = 24) -> Dict[str, any]:
+        """
+        Aggregate the last `hours` hourly buckets (cost depends on the window, not the history)
+        """
+        end = (end or max(self.buckets['hourly'], default=pd.Timestamp.now())).floor('h')
+        window = _Bucket()
+        for offset in range(hours):
+            bucket = self.buckets['hourly'].get(end - pd.Timedelta(hours=offset))
+            if bucket is not None:
+                window.merge(bucket)
+        return self._describe(window, window_end=end, window_hours=hours)
+
+    def _describe(self, bucket: _Bucket, **extra) -> Dict[str, any]:
+        quantiles = bucket.duration_quantiles()
+        return {
+            **extra,
+            'completions': bucket.completions,
+            'duration_p10_minutes': quantiles[0.1] / 60,
+            'duration_median_minutes': quantiles[0.5] / 60,
+            'duration_p90_minutes': quantiles[0.9] / 60,
+            'clips_exposed': len(bucket.clip_exposure),
+            'least_exposed_clip': min(bucket.clip_exposure, key=bucket.clip_exposure.get) if bucket.clip_exposure else None,
+            **{f"mean_{rating}": value for rating, value in bucket.rating_means().items()}
+        }
+
+    def summary(self, frequency: str = 'daily') -> pd.DataFrame:
+        """
+        One row per bucket with completions, duration quantiles and rating means
+        """
+        rows = [self._describe(bucket, bucket_start=key) for key, bucket in sorted(self.buckets[frequency].items())]
+        summary = pd.DataFrame(rows)
+        if not summary.empty:
+            summary['cumulative_completions'] = summary['completions'].cumsum()
+        return summary
+
+    def clip_exposure(self, frequency: str = 'daily') -> pd.DataFrame:
+        """
+        Bucket × clip exposure counts
+        """
+        data = {key: bucket.clip_exposure for key, bucket in sorted(self.buckets[frequency].items())}
+        return pd.DataFrame(data).T.fillna(0).astype(int).sort_index(axis=1)
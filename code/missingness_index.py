@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+Item Nonresponse Index for Short Form Video Narrative Perception Study
+
+This module stores item-level nonresponse as one 64-bit mask per
+(ResponseId, video_id) row: bit i is set when item i was answered. The items
+are the 28 per-clip questions followed by the participant-level demographic
+block. All queries are vectorized bitwise operations on the mask array:
+1. Missingness pattern counts
+2. Per-item missing counts and co-missingness matrices
+3. "Who skipped X but answered Y" row selection
+
+Example:
+    index = MissingnessIndex.from_clip_responses(clip_responses, participants, questions)
+    index.pattern_counts(top=10)
+    index.skipped_but_answered('satisfactory_resolution', 'narrative_resolution')
+
+Author: Generated for Short Form Video Narrative Analysis Project
+Date: 2025
+"""
+
+import pandas as pd
+import numpy as np
+import logging
+from typing import Dict, List, Optional, Union
+
+from rating_encoding import SEEN_NOT_ANSWERED, DEMOGRAPHIC_ITEMS
+
+logger = logging.getLogger(__name__)
+
+MAX_ITEMS = 64
+
+
+def _answered(values: pd.Series) -> np.ndarray:
+    """
+    Answered = present, not blank and not Qualtrics's "seen but not answered" code
+    """
+    text = values.astype(str).str.strip()
+    return (values.notna() & (text != '') & (text != SEEN_NOT_ANSWERED)).to_numpy()
+
+
+class MissingnessIndex:
+    """
+    One answered-items bitmask per participant-video row
+    """
+
+    def __init__(self, masks: np.ndarray, items: List[str], response_ids: np.ndarray, video_ids: np.ndarray):
+        """
+        Initialize the index
+
+        Args:
+            masks: uint64 array, bit i set when items[i] was answered
+            items: Item names in bit order (at most 64)
+            response_ids: ResponseId of each row
+            video_ids: video_id of each row
+        """
+        if len(items) > MAX_ITEMS:
+            raise ValueError(f"At most {MAX_ITEMS} items can be indexed, got {len(items)}")
+
+        self.masks = np.asarray(masks, dtype=np.uint64)
+        self.items = list(items)
+        self.response_ids = np.asarray(response_ids)
+        self.video_ids = np.asarray(video_ids)
+        self._bits = {item: np.uint64(1) << np.uint64(i) for i, item in enumerate(self.items)}
+        self.all_items = self._bitmask(self.items)
+
+    @classmethod
+    def from_clip_responses(cls, clip_responses: pd.DataFrame, participants: Optional[pd.DataFrame],
+                            questions: List[str], demographic_items: Optional[List[str]] = None) -> 'MissingnessIndex':
+        """
+        Build the index from answered clip items (triples) and participant-level columns
+
+        Rows are the participant-video pairs with at least one answered clip item.
+
+        Args:
+            clip_responses: Answered items with ResponseId, video_id, question and value
+            participants: Participant-level data with ResponseId and the demographic columns
+            questions: Per-clip question names in bit order
+            demographic_items: Participant-level items appended after the questions
+                (defaults to the DEMOGRAPHIC_ITEMS present in participants)
+        """
+        if demographic_items is None:
+            demographic_items = [col for col in DEMOGRAPHIC_ITEMS
+                                 if participants is not None and col in participants.columns]
+        items = list(questions) + list(demographic_items)
+
+        answered = clip_responses[_answered(clip_responses['value'])]
+        row_codes, row_keys = pd.MultiIndex.from_arrays(
+            [answered['ResponseId'].astype(str), answered['video_id'].astype(str)]).factorize()
+        question_codes = pd.Categorical(answered['question'].astype(str), categories=list(questions)).codes
+
+        masks = np.zeros(len(row_keys), dtype=np.uint64)
+        known = question_codes >= 0
+        np.bitwise_or.at(masks, row_codes[known], np.uint64(1) << question_codes[known].astype(np.uint64))
+
+        response_ids = row_keys.get_level_values(0).to_numpy()
+        if demographic_items:
+            demo_masks = np.zeros(len(participants), dtype=np.uint64)
+            for offset, col in enumerate(demographic_items):
+                bit = np.uint64(1) << np.uint64(len(questions) + offset)
+                demo_masks |= np.where(_answered(participants[col]), bit, np.uint64(0))
+            lookup = pd.Series(demo_masks, index=participants['ResponseId'].astype(str).to_numpy())
+            lookup = lookup[~lookup.index.duplicated()]
+            masks |= lookup.reindex(response_ids, fill_value=0).to_numpy(dtype=np.uint64)
+
+        logger.info(f"Missingness index: {len(masks)} participant-video rows × {len(items)} items")
+        return cls(masks, items, response_ids, row_keys.get_level_values(1).to_numpy())
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, items: List[str]) -> 'MissingnessIndex':
+        """
+        Build the index from a long-format frame (one row per participant-video)
+        """
+        masks = np.zeros(len(df), dtype=np.uint64)
+        for i, item in enumerate(items):
+            if item in df.columns:
+                masks |= np.where(_answered(df[item]), np.uint64(1) << np.uint64(i), np.uint64(0))
+        return cls(masks, items, df['ResponseId'].to_numpy(), df['video_id'].to_numpy())
+
+    def _bitmask(self, items: Union[str, List[str]]) -> np.uint64:
+        items = [items] if isinstance(items, str) else items
+        unknown = [item for item in items if item not in self._bits]
+        if unknown:
+            raise KeyError(f"Items not in index: {unknown}")
+        mask = np.uint64(0)
+        for item in items:
+            mask |= self._bits[item]
+        return mask
+
+    def __len__(self) -> int:
+        return len(self.masks)
+
+    def answered(self, item: str) -> np.ndarray:
+        return (self.masks & self._bits[item]) != 0
+
+    def missing(self, item: str) -> np.ndarray:
+        return (self.masks & self._bits[item]) == 0
+
+    def missing_counts(self, items: Optional[List[str]] = None) -> np.ndarray:
+        """
+        Number of missing items (among `items`) in each row
+        """
+        items = items or self.items
+        patterns, inverse = np.unique(self.masks & self._bitmask(items), return_inverse=True)
+        return (~self._unpack(patterns, items)).sum(axis=1)[inverse.ravel()]
+
+    def _unpack(self, masks: np.ndarray, items: List[str]) -> np.ndarray:
+        """
+        Boolean (rows × items) answered matrix for the given masks
+        """
+        shifts = np.array([self.items.index(item) for item in items], dtype=np.uint64)
+        return ((masks[:, None] >> shifts) & np.uint64(1)).astype(bool)
+
+    def pattern_counts(self, items: Optional[List[str]] = None, top: Optional[int] = None) -> pd.DataFrame:
+        """
+        Count rows per missingness pattern over the selected items
+
+        Returns:
+            pd.DataFrame: One row per pattern (most frequent first) with the mask, row count,
+            number of missing items and the names of the missing items
+        """
+        items = items or self.items
+        patterns, counts = np.unique(self.masks & self._bitmask(items), return_counts=True)
+        order = np.argsort(-counts, kind='stable')
+        patterns, counts = patterns[order], counts[order]
+        if top is not None:
+            patterns, counts = patterns[:top], counts[:top]
+
+        missing = ~self._unpack(patterns, items)
+        return pd.DataFrame({
+            'pattern': patterns,
+            'n_rows': counts,
+            'n_missing_items': missing.sum(axis=1),
+            'missing_items': [', '.join(np.array(items)[row]) for row in missing]
+        })
+
+    def item_missing_summary(self) -> pd.DataFrame:
+        """
+        Missing count and percentage per item
+        """
+        patterns, counts = np.unique(self.masks, return_counts=True)
+        missing = (~self._unpack(patterns, self.items)).astype(np.int64)
+        n_missing = counts @ missing
+        return pd.DataFrame({
+            'missing_count': n_missing,
+            'missing_percentage': n_missing / max(len(self.masks), 1) * 100
+        }, index=pd.Index(self.items, name='item'))
+
+    def co_missingness(self, items: Optional[List[str]] = None, normalize: bool = False) -> pd.DataFrame:
+        """
+        Item × item counts of rows missing both items (diagonal = missing counts)
+
+        Computed over distinct patterns weighted by their counts, so the cost
+        depends on the number of patterns rather than rows.
+
+        Args:
+            items: Items to include (defaults to all)
+            normalize: Divide by the number of rows
+        """
+        items = items or self.items
+        patterns, counts = np.unique(self.masks & self._bitmask(items), return_counts=True)
+        missing = (~self._unpack(patterns, items)).astype(np.int64)
+        matrix = (missing * counts[:, None]).T @ missing
+        result = pd.DataFrame(matrix, index=items, columns=items)
+        return result / max(len(self.masks), 1) if normalize else result
+
+    def select(self, skipped: Union[str, List[str], None] = None,
+               answered: Union[str, List[str], None] = None) -> np.ndarray:
+        """
+        Boolean row selector: all `skipped` items missing and all `answered` items answered
+        """
+        selected = np.ones(len(self.masks), dtype=bool)
+        if skipped:
+            selected &= (self.masks & self._bitmask(skipped)) == 0
+        if answered:
+            required = self._bitmask(answered)
+            selected &= (self.masks & required) == required
+        return selected
+
+    def skipped_but_answered(self, skipped: Union[str, List[str]], answered: Union[str, List[str]]) -> pd.DataFrame:
+        """
+        Participant-video rows that skipped `skipped` but answered `answered`
+        """
+        selected = self.select(skipped, answered)
+        return pd.DataFrame({'ResponseId': self.response_ids[selected], 'video_id': self.video_ids[selected]})
+
+    def summary(self, top: int = 5) -> Dict[str, any]:
+        """
+        Compact nonresponse summary for the data quality report
+        """
+        item_summary = self.item_missing_summary()
+        patterns, counts = np.unique(self.masks, return_counts=True)
+        n_answered = self._unpack(patterns, self.items).sum(axis=1)
+        return {
+            'rows': len(self.masks),
+            'complete_rows': int(counts[patterns == self.all_items].sum()),
+            'distinct_patterns': len(patterns),
+            'items_answered_mean': float(counts @ n_answered / len(self.masks)) if len(self.masks) else 0.0,
+            'item_missing': item_summary[item_summary['missing_count'] > 0].to_dict(orient='index'),
+            'top_patterns': self.pattern_counts(top=top)[['n_rows', 'missing_items']].to_dict(orient='records')
+        }
+
+    def to_frame(self) -> pd.DataFrame:
+        return pd.DataFrame({'ResponseId': self.response_ids, 'video_id': self.video_ids, 'answered_mask': self.masks})
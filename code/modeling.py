@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Prediction Models for Short Form Video Narrative Perception Study
+
+This module implements the Phase 4 prediction analysis from the analysis plan:
+random-forest models of narrative perceptions with cross-validation and
+feature importance. It:
+1. Assembles a typed (float32) feature matrix once from encoded ratings, timing,
+   familiarity and participant-level Pre_app_*/Pre_fan/Pre_freq answers
+2. Caches the matrix on disk, keyed by a fingerprint of the input data
+3. Runs participant-grouped cross-validation with folds and permutation
+   importances computed in parallel, reusing the same matrix for every model
+
+Author: Generated for Short Form Video Narrative Analysis Project
+Date: 2025
+"""
+
+import pandas as pd
+import numpy as np
+import hashlib
+import logging
+from pathlib import Path
+from typing import Dict, List, Optional
+from joblib import Parallel, delayed
+from sklearn.base import clone
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.impute import SimpleImputer
+from sklearn.inspection import permutation_importance
+from sklearn.metrics import mean_absolute_error, r2_score
+from sklearn.model_selection import GroupKFold
+from sklearn.pipeline import make_pipeline
+
+from rating_encoding import encode_ratings, encode_participant_items
+
+logger = logging.getLogger(__name__)
+
+# Bump when the feature layout changes so stale caches are rebuilt
+FEATURE_MATRIX_VERSION = 1
+
+
+class FeatureMatrix:
+    """
+    Model-ready features for answered participant-video rows
+    """
+
+    def __init__(self, X: np.ndarray, feature_names: List[str], response_ids: np.ndarray,
+                 video_ids: np.ndarray, fingerprint: str):
+        self.X = X
+        self.feature_names = list(feature_names)
+        self.response_ids = response_ids
+        self.video_ids = video_ids
+        self.fingerprint = fingerprint
+        self._columns = {name: i for i, name in enumerate(self.feature_names)}
+
+    @property
+    def groups(self) -> np.ndarray:
+        """Integer participant codes for grouped cross-validation"""
+        return pd.factorize(self.response_ids)[0]
+
+    def column(self, name: str) -> np.ndarray:
+        return self.X[:, self._columns[name]]
+
+    def design(self, target: str, exclude: Optional[List[str]] = None):
+        """
+        Split into (X, y, feature names) for one target, dropping rows where the target is missing
+        """
+        excluded = {target} | set(exclude or [])
+        keep_cols = [i for name, i in self._columns.items() if name not in excluded]
+        y = self.column(target)
+        rows = ~np.isnan(y)
+        return self.X[rows][:, keep_cols], y[rows], [self.feature_names[i] for i in keep_cols], rows
+
+    def save(self, path: str):
+        np.savez_compressed(path, X=self.X, feature_names=np.array(self.feature_names),
+                            response_ids=self.response_ids.astype(str), video_ids=self.video_ids.astype(str),
+                            fingerprint=np.array(self.fingerprint))
+
+    @classmethod
+    def load(cls, path: str) -> 'FeatureMatrix':
+        with np.load(path, allow_pickle=False) as data:
+            return cls(data['X'], data['feature_names'].tolist(), data['response_ids'],
+                       data['video_ids'], str(data['fingerprint']))
+
+
+def _fingerprint(long_df: pd.DataFrame, participants: Optional[pd.DataFrame]) -> str:
+    """
+    Content hash of the inputs, sensitive to row order and repeated rows (plus the feature layout version)
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for frame in (long_df, participants):
+        if frame is None:
+            continue
+        digest.update('\x1f'.join(map(str, frame.columns)).encode('utf-8'))
+        digest.update(np.ascontiguousarray(pd.util.hash_pandas_object(frame, index=False).to_numpy()).tobytes())
+    return f"v{FEATURE_MATRIX_VERSION}-{len(long_df)}-{digest.hexdigest()}"
+
+
+def build_feature_matrix(long_df: pd.DataFrame, participants: Optional[pd.DataFrame] = None,
+                         cache_path: Optional[str] = None) -> FeatureMatrix:
+    """
+    Assemble (or load from cache) the feature matrix for answered participant-video rows
+
+    Args:
+        long_df: Cleaned long-format data
+        participants: Participant-level data with Pre_app_*/Pre_fan/Pre_freq (`StarSchema.participants`,
+            i.e. `{prefix}_participants.csv`)
+        cache_path: Optional .npz path; reused when the inputs have not changed
+
+    Returns:
+        FeatureMatrix: float32 features with ResponseId/video_id row labels
+    """
+    fingerprint = _fingerprint(long_df, participants)
+
+    if cache_path and Path(cache_path).exists():
+        cached = FeatureMatrix.load(cache_path)
+        if cached.fingerprint == fingerprint:
+            logger.info(f"Loaded cached feature matrix {cached.X.shape} from {cache_path}")
+            return cached
+        logger.info("Cached feature matrix is stale; rebuilding")
+
+    ratings = encode_ratings(long_df)
+    answered = ratings.drop(columns=[c for c in ratings.columns if c.startswith('timing_')]).notna().any(axis=1)
+    ratings = ratings[answered]
+    rows = long_df.loc[ratings.index, ['ResponseId', 'video_id']]
+
+    features = [ratings.reset_index(drop=True)]
+    if participants is not None:
+        participant_items = encode_participant_items(participants)
+        participant_items.index = participants['ResponseId'].to_numpy()
+        features.append(participant_items.reindex(rows['ResponseId']).reset_index(drop=True))
+
+    if 'Duration (in seconds)' in long_df.columns:
+        duration = pd.to_numeric(long_df.loc[ratings.index, 'Duration (in seconds)'], errors='coerce')
+        features.append(pd.DataFrame({'session_duration_log': np.log1p(duration).to_numpy(dtype=np.float32)}))
+
+    frame = pd.concat(features, axis=1)
+    matrix = FeatureMatrix(frame.to_numpy(dtype=np.float32), list(frame.columns),
+                           rows['ResponseId'].to_numpy(dtype=str), rows['video_id'].to_numpy(dtype=str), fingerprint)
+    logger.info(f"Built feature matrix: {matrix.X.shape[0]} rows × {matrix.X.shape[1]} features")
+
+    if cache_path:
+        matrix.save(cache_path)
+        logger.info(f"Cached feature matrix to {cache_path}")
+
+    return matrix
+
+
+def default_model_configs(random_state: int = 42) -> Dict[str, object]:
+    """
+    Random-forest configurations compared in the Phase 4 analysis
+    """
+    return {
+        'rf_shallow': RandomForestRegressor(n_estimators=300, max_depth=4, min_samples_leaf=5,
+                                            random_state=random_state, n_jobs=1),
+        'rf_default': RandomForestRegressor(n_estimators=300, min_samples_leaf=3,
+                                            random_state=random_state, n_jobs=1)
+    }
+
+
+def _fit_fold(name: str, estimator, X: np.ndarray, y: np.ndarray, train: np.ndarray, test: np.ndarray,
+              fold: int, n_repeats: int, random_state: int) -> Dict[str, any]:
+    """
+    Fit one model on one fold and compute test scores and permutation importances
+    """
+    model = make_pipeline(SimpleImputer(strategy='median'), clone(estimator))
+    model.fit(X[train], y[train])
+    predictions = model.predict(X[test])
+
+    importances = permutation_importance(model, X[test], y[test], n_repeats=n_repeats,
+                                         random_state=random_state, n_jobs=1)
+    return {
+        'model': name,
+        'fold': fold,
+        'n_train': len(train),
+        'n_test': len(test),
+        'r2': r2_score(y[test], predictions),
+        'mae': mean_absolute_error(y[test], predictions),
+        'importances': importances.importances_mean
+    }
+
+
+def cross_validate_models(matrix: FeatureMatrix, target: str, model_configs: Optional[Dict[str, object]] = None,
+                          exclude: Optional[List[str]] = None, n_splits: int = 5, n_repeats: int = 5,
+                          n_jobs: int = -1, random_state: int = 42) -> Dict[str, pd.DataFrame]:
+    """
+    Participant-grouped cross-validation of several models on the same feature matrix
+
+    All (model, fold) fits run in parallel; each fold also computes permutation
+    importances on its held-out participants.
+
+    Args:
+        matrix: Feature matrix from build_feature_matrix()
+        target: Feature to predict (e.g. 'want_next_story')
+        model_configs: {name: estimator}; defaults to default_model_configs()
+        exclude: Features to drop in addition to the target (e.g. closely related items)
+        n_splits: Number of grouped folds
+        n_repeats: Permutation repeats per feature
+        n_jobs: Parallel workers (-1 = all cores)
+        random_state: Seed for permutation importance
+
+    Returns:
+        dict: 'scores' (one row per model and fold), 'summary' (mean ± std per model)
+        and 'importances' (mean permutation importance per model and feature)
+    """
+    model_configs = model_configs or default_model_configs(random_state)
+    X, y, feature_names, rows = matrix.design(target, exclude)
+    groups = matrix.groups[rows]
+
+    n_splits = min(n_splits, len(np.unique(groups)))
+    folds = list(GroupKFold(n_splits=n_splits).split(X, y, groups))
+    logger.info(f"Cross-validating {len(model_configs)} models × {n_splits} folds for '{target}' "
+                f"({len(y)} rows, {X.shape[1]} features)")
+
+    results = Parallel(n_jobs=n_jobs)(
+        delayed(_fit_fold)(name, estimator, X, y, train, test, fold, n_repeats, random_state)
+        for name, estimator in model_configs.items()
+        for fold, (train, test) in enumerate(folds)
+    )
+
+    scores = pd.DataFrame([{k: v for k, v in r.items() if k != 'importances'} for r in results])
+    summary = scores.groupby('model')[['r2', 'mae']].agg(['mean', 'std'])
+
+    importances = pd.DataFrame(
+        [r['importances'] for r in results],
+        index=pd.MultiIndex.from_arrays([scores['model'], scores['fold']]),
+        columns=feature_names)
+    importances = importances.groupby(level='model').mean().T
+
+    return {'scores': scores, 'summary': summary, 'importances': importances}
@@ -0,0 +1,445 @@
+#!/usr/bin/env python3
+"""
+Asynchronous Qualtrics Export Fetcher for Short Form Video Narrative Perception Study
+
+This script pulls survey exports from a Qualtrics-style response export API and
+streams them straight into the data cleaning pipeline. For each survey it:
+1. Starts a CSV export (POST .../export-responses)
+2. Polls export progress until the file is ready
+3. Downloads the file and hands the bytes to the cleaner as they arrive
+
+Several surveys are pulled concurrently over reused keep-alive connections, so
+waiting on the network for one survey overlaps with parsing another. Only the
+standard library is used for HTTP, which also makes it easy to point the fetcher
+at a local stub server via `base_url`.
+
+Author: Generated for Short Form Video Narrative Analysis Project
+Date: 2025
+"""
+
+import asyncio
+import io
+import json
+import os
+import queue
+import ssl
+import logging
+from pathlib import Path
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from data_cleaning import VideoNarrativeDataCleaner
+
+logger = logging.getLogger(__name__)
+
+
+class HTTPError(Exception):
+    """Raised when the export API returns a non-success status"""
+
+
+class _Response:
+    """
+    Minimal HTTP/1.1 response whose body can be streamed or read at once
+    """
+
+    def __init__(self, pool: '_ConnectionPool', key: Tuple[str, str, int],
+                 reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                 status: int, headers: Dict[str, str]):
+        self._pool = pool
+        self._key = key
+        self._reader = reader
+        self._writer = writer
+        self.status = status
+        self.headers = headers
+        self._released = False
+
+    def close(self, reusable: bool = False):
+        """
+        Hand the connection back to the pool (reusable) or close it; later calls do nothing
+        """
+        if not self._released:
+            self._released = True
+            self._pool.release(self._key, self._reader, self._writer, reusable)
+
+    async def iter_chunks(self, chunk_size: int = 64 * 1024) -> AsyncIterator[bytes]:
+        """
+        Yield the response body as it arrives (Content-Length, chunked or read-to-close)
+
+        The connection is pooled again only when the body was read to the end; if
+        reading fails or the consumer stops early, it is closed.
+        """
+        reusable = self.headers.get('connection', '').lower() != 'close'
+        complete = False
+
+        try:
+            if self.headers.get('transfer-encoding', '').lower() == 'chunked':
+                while True:
+                    size_line = await self._reader.readline()
+                    if not size_line:
+                        raise ConnectionError("Connection closed before the next chunk")
+                    size = int(size_line.split(b';')[0].strip(), 16)
+                    if size == 0:
+                        # Skip trailers up to the terminating blank line
+                        while (await self._reader.readline()) not in (b'\r\n', b'\n', b''):
+                            pass
+                        break
+                    remaining = size
+                    while remaining > 0:
+                        data = await self._reader.read(min(chunk_size, remaining))
+                        if not data:
+                            raise ConnectionError("Connection closed mid-chunk")
+                        remaining -= len(data)
+                        yield data
+                    await self._reader.readline()
+            elif 'content-length' in self.headers:
+                remaining = int(self.headers['content-length'])
+                while remaining > 0:
+                    data = await self._reader.read(min(chunk_size, remaining))
+                    if not data:
+                        raise ConnectionError("Connection closed before body was complete")
+                    remaining -= len(data)
+                    yield data
+            else:
+                reusable = False
+                while True:
+                    data = await self._reader.read(chunk_size)
+                    if not data:
+                        break
+                    yield data
+            complete = True
+        finally:
+            self.close(reusable and complete)
+
+    async def read(self) -> bytes:
+        return b''.join([chunk async for chunk in self.iter_chunks()])
+
+
+class _ConnectionPool:
+    """
+    Keep-alive connections per (scheme, host, port), reused across requests
+    """
+
+    def __init__(self, max_idle_per_host: int = 4):
+        self.max_idle_per_host = max_idle_per_host
+        self._idle: Dict[Tuple[str, str, int], List] = {}
+        self._ssl_context = ssl.create_default_context()
+
+    async def _acquire(self, key: Tuple[str, str, int]):
+        while self._idle.get(key):
+            reader, writer = self._idle[key].pop()
+            if not writer.is_closing() and not reader.at_eof():
+                return reader, writer
+        scheme, host, port = key
+        return await asyncio.open_connection(host, port, ssl=self._ssl_context if scheme == 'https' else None)
+
+    def release(self, key, reader, writer, reusable: bool):
+        idle = self._idle.setdefault(key, [])
+        if reusable and len(idle) < self.max_idle_per_host and not writer.is_closing():
+            idle.append((reader, writer))
+        else:
+            writer.close()
+
+    async def request(self, method: str, url: str, headers: Optional[Dict[str, str]] = None,
+                      body: Optional[bytes] = None) -> _Response:
+        parts = urlsplit(url)
+        port = parts.port or (443 if parts.scheme == 'https' else 80)
+        key = (parts.scheme, parts.hostname, port)
+        target = parts.path + (f"?{parts.query}" if parts.query else '')
+
+        reader, writer = await self._acquire(key)
+        try:
+            lines = [f"{method} {target or '/'} HTTP/1.1", f"Host: {parts.netloc}", "Connection: keep-alive"]
+            for name, value in (headers or {}).items():
+                lines.append(f"{name}: {value}")
+            lines.append(f"Content-Length: {len(body) if body else 0}")
+            writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + (body or b''))
+            await writer.drain()
+
+            status_line = await reader.readline()
+            if not status_line:
+                raise ConnectionError(f"No response from {parts.netloc}")
+            status = int(status_line.split()[1])
+
+            response_headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                response_headers[name.strip().lower()] = value.strip()
+        except BaseException:
+            # The connection is in an unknown state (e.g. half-sent request); never pool it
+            writer.close()
+            raise
+
+        return _Response(self, key, reader, writer, status, response_headers)
+
+    def close(self):
+        for connections in self._idle.values():
+            for _, writer in connections:
+                writer.close()
+        self._idle.clear()
+
+
+class _StreamBridge(io.RawIOBase):
+    """
+    Blocking file-like reader fed with chunks from the event loop, so the
+    (synchronous) cleaner can parse an export while it is still downloading
+    """
+
+    def __init__(self, max_chunks: int = 64):
+        self._queue = queue.Queue(maxsize=max_chunks)
+        self._buffer = b''
+        self._done = False
+        self._abandoned = False
+        self._error = None
+
+    def readable(self) -> bool:
+        return True
+
+    def abandon(self):
+        """Stop accepting chunks once the consumer has finished or failed"""
+        self._abandoned = True
+
+    def fail(self, error: Exception):
+        """
+        Called from the event loop when the download fails or is cancelled; the
+        reading side raises `error` on its next read without waiting for a chunk
+        """
+        self._error = error
+        self._abandoned = True
+
+    def put(self, chunk):
+        """
+        Called from a worker thread; None marks the end of the stream and an
+        exception instance makes the reading side fail with it
+        """
+        while not self._abandoned:
+            try:
+                self._queue.put(chunk, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    def readinto(self, buffer) -> int:
+        while not self._buffer and not self._done:
+            if self._error is not None:
+                self._done = True
+                raise self._error
+            try:
+                chunk = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            if chunk is None:
+                self._done = True
+            elif isinstance(chunk, Exception):
+                self._done = True
+                raise chunk
+            else:
+                self._buffer = chunk
+        n = min(len(buffer), len(self._buffer))
+        buffer[:n] = self._buffer[:n]
+        self._buffer = self._buffer[n:]
+        return n
+
+
+class QualtricsExportFetcher:
+    """
+    Concurrent export/poll/download client that streams exports into the cleaner
+    """
+
+    def __init__(self, api_token: str, base_url: str, output_dir: str,
+                 max_concurrent: int = 4, poll_interval: float = 2.0, timeout: float = 600.0):
+        """
+        Initialize the fetcher
+
+        Args:
+            api_token: Qualtrics API token (sent as X-API-TOKEN)
+            base_url: API root, e.g. https://<datacenter>.qualtrics.com or a local stub server
+            output_dir: Directory to save cleaned data for each survey
+            max_concurrent: Maximum number of surveys pulled at the same time
+            poll_interval: Seconds between export progress checks
+            timeout: Seconds to wait for an export to complete before giving up
+        """
+        self.api_token = api_token
+        self.base_url = base_url.rstrip('/')
+        self.output_dir = Path(output_dir)
+        self.max_concurrent = max_concurrent
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self._pool = _ConnectionPool(max_idle_per_host=max_concurrent)
+
+    def _headers(self) -> Dict[str, str]:
+        return {'X-API-TOKEN': self.api_token, 'Content-Type': 'application/json', 'Accept': 'application/json'}
+
+    async def _request_json(self, method: str, url: str, payload: Optional[Dict] = None) -> Dict:
+        body = json.dumps(payload).encode('utf-8') if payload is not None else None
+        response = await self._pool.request(method, url, self._headers(), body)
+        content = await response.read()
+        if response.status >= 400:
+            raise HTTPError(f"{method} {url} returned {response.status}: {content[:200]!r}")
+        return json.loads(content)
+
+    async def list_surveys(self) -> List[Dict]:
+        """
+        List all surveys available to the token, following `nextPage` links
+        """
+        surveys = []
+        url = f"{self.base_url}/API/v3/surveys"
+        while url:
+            data = await self._request_json('GET', url)
+            surveys.extend(data['result']['elements'])
+            url = data['result'].get('nextPage')
+        logger.info(f"Found {len(surveys)} surveys")
+        return surveys
+
+    async def start_export(self, survey_id: str) -> str:
+        """
+        Start an uncompressed CSV export and return its progress id
+        """
+        url = f"{self.base_url}/API/v3/surveys/{survey_id}/export-responses"
+        data = await self._request_json('POST', url, {'format': 'csv', 'compress': False, 'useLabels': True})
+        return data['result']['progressId']
+
+    async def wait_for_export(self, survey_id: str, progress_id: str) -> str:
+        """
+        Poll export progress until complete and return the file id
+        """
+        url = f"{self.base_url}/API/v3/surveys/{survey_id}/export-responses/{progress_id}"
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.timeout
+
+        while True:
+            result = (await self._request_json('GET', url))['result']
+            status = result.get('status')
+            if status == 'complete':
+                return result['fileId']
+            if status == 'failed':
+                raise HTTPError(f"Export {progress_id} for survey {survey_id} failed")
+            if loop.time() > deadline:
+                raise TimeoutError(f"Export {progress_id} for survey {survey_id} did not finish in {self.timeout}s")
+            logger.info(f"Survey {survey_id}: export {result.get('percentComplete', 0):.0f}% complete")
+            await asyncio.sleep(self.poll_interval)
+
+    async def stream_into_cleaner(self, survey_id: str, file_id: str,
+                                  filename_prefix: Optional[str] = None) -> Dict[str, str]:
+        """
+        Download an export and clean it while the bytes are still arriving
+
+        The download runs on the event loop and feeds a bounded bridge; the cleaner
+        parses from the bridge in a worker thread, so no full file lands on disk first.
+        """
+        url = f"{self.base_url}/API/v3/surveys/{survey_id}/export-responses/{file_id}/file"
+        prefix = filename_prefix or f"{survey_id}_cleaned"
+
+        cleaner = VideoNarrativeDataCleaner(self.output_dir / f"{survey_id}.csv", self.output_dir)
+        bridge = _StreamBridge()
+        cleaning = asyncio.create_task(asyncio.to_thread(cleaner.run_full_pipeline, prefix, io.BufferedReader(bridge)))
+        cleaning.add_done_callback(lambda _: bridge.abandon())
+
+        try:
+            response = await self._pool.request('GET', url, {'X-API-TOKEN': self.api_token})
+            if response.status >= 400:
+                raise HTTPError(f"GET {url} returned {response.status}: {(await response.read())[:200]!r}")
+
+            n_bytes = 0
+            chunks = response.iter_chunks()
+            try:
+                async for chunk in chunks:
+                    n_bytes += len(chunk)
+                    # put() blocks when the cleaner falls behind, so hand it to a thread
+                    await asyncio.to_thread(bridge.put, chunk)
+            finally:
+                # Runs the body reader's cleanup now, closing the connection if we stopped early
+                await chunks.aclose()
+            logger.info(f"Survey {survey_id}: downloaded {n_bytes} bytes")
+            await asyncio.to_thread(bridge.put, None)
+        except BaseException as e:
+            # Fail the cleaner rather than letting it save a truncated export. This also
+            # runs on cancellation, so the worker thread never waits for a stream that
+            # will not finish (and the event loop can shut its executor down).
+            bridge.fail(ConnectionError(f"Download of survey {survey_id} failed: {str(e) or type(e).__name__}"))
+            await asyncio.gather(cleaning, return_exceptions=True)
+            raise
+
+        return await cleaning
+
+    async def fetch_survey(self, survey_id: str, filename_prefix: Optional[str] = None) -> Dict[str, str]:
+        """
+        Export, poll and stream-clean one survey
+        """
+        logger.info(f"Survey {survey_id}: starting export")
+        progress_id = await self.start_export(survey_id)
+        file_id = await self.wait_for_export(survey_id, progress_id)
+        return await self.stream_into_cleaner(survey_id, file_id, filename_prefix)
+
+    async def fetch_surveys(self, survey_ids: List[str]) -> Dict[str, Dict[str, str]]:
+        """
+        Pull several surveys concurrently (bounded by max_concurrent)
+
+        If one survey fails (or this call is cancelled), the others are cancelled and
+        waited for before the error is raised, so no cleaner thread is left running.
+
+        Returns:
+            dict: Saved cleaned files for each survey id
+        """
+        semaphore = asyncio.Semaphore(self.max_concurrent)
+
+        async def bounded(survey_id):
+            async with semaphore:
+                return await self.fetch_survey(survey_id)
+
+        tasks = [asyncio.create_task(bounded(survey_id)) for survey_id in survey_ids]
+        try:
+            results = await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        return dict(zip(survey_ids, results))
+
+    async def run(self, survey_ids: Optional[List[str]] = None) -> Dict[str, Dict[str, str]]:
+        """
+        Pull the given surveys (or every listed survey) and close pooled connections afterwards
+        """
+        try:
+            if not survey_ids:
+                survey_ids = [survey['id'] for survey in await self.list_surveys()]
+            return await self.fetch_surveys(survey_ids)
+        finally:
+            self._pool.close()
+
+
+def main():
+    """
+    Main function to pull and clean exports for the configured surveys
+    """
+    api_token = os.environ.get('QUALTRICS_API_TOKEN')
+    base_url = os.environ.get('QUALTRICS_BASE_URL')
+    survey_ids = [s for s in os.environ.get('QUALTRICS_SURVEY_IDS', '').split(',') if s]
+    output_dir = "/Users/yaojunyan/Desktop/short-form-video-narrative-analysis/data"
+
+    if not api_token or not base_url:
+        print("ERROR: set QUALTRICS_API_TOKEN and QUALTRICS_BASE_URL")
+        return 1
+
+    fetcher = QualtricsExportFetcher(api_token, base_url, output_dir)
+
+    try:
+        results = asyncio.run(fetcher.run(survey_ids))
+
+        for survey_id, saved_files in results.items():
+            print(f"\n{survey_id}:")
+            for file_type, file_path in saved_files.items():
+                print(f"  {file_type}: {file_path}")
+
+    except Exception as e:
+        print(f"\nERROR: {e}")
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
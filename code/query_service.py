@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+"""
+Local Query Service for Short Form Video Narrative Perception Study
+
+This script runs a small long-lived HTTP/JSON service over the cleaned star
+schema tables (participants, responses, videos) so analysts can ask filter +
+group-by + aggregate questions (e.g. "mean tension_end for clip_17 among EN
+respondents") without re-running whole scripts. It:
+1. Loads the cleaned tables once and keeps them in memory; participant columns
+   (UserLanguage, Pre_*, Demo_*, ...) are joined onto the responses only when a
+   query uses them
+2. Caches query results in an LRU cache
+3. Reloads the tables (and clears the cache) when the cleaner writes new ones;
+   if they cannot be read yet, the previous data keeps being served and the
+   reload is retried on the next request
+
+Example:
+    curl -s localhost:8765/query -d '{"question": "tension_end", "agg": "mean",
+        "filters": {"video_id": "clip_17", "UserLanguage": "EN"}, "group_by": "Demo_gender"}'
+
+Author: Generated for Short Form Video Narrative Analysis Project
+Date: 2025
+"""
+
+import pandas as pd
+import numpy as np
+import json
+import logging
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List
+from urllib.parse import urlsplit, parse_qs
+
+from star_schema import StarSchema, TABLE_SUFFIXES
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Aggregates that need numeric values; the rest work on any column
+NUMERIC_AGGREGATES = {'mean', 'median', 'std', 'min', 'max', 'sum'}
+SUPPORTED_AGGREGATES = NUMERIC_AGGREGATES | {'count', 'nunique', 'value_counts'}
+
+
+class QueryError(ValueError):
+    """Raised for malformed or unsupported queries"""
+
+
+class CleanedDataStore:
+    """
+    In-memory cleaned star schema with an LRU result cache and reload on file change
+    """
+
+    def __init__(self, data_dir: str, prefix: str, cache_size: int = 1024):
+        """
+        Initialize the store
+
+        Args:
+            data_dir: Directory with the star schema tables written by data_cleaning.py
+            prefix: Filename prefix of the tables (e.g. 'video_narrative_cleaned')
+            cache_size: Maximum number of cached query results
+        """
+        self.data_dir = Path(data_dir)
+        self.prefix = prefix
+        self.cache_size = cache_size
+        self.schema = None
+        self.columns = []
+        self._columns = {}
+        self._numeric = {}
+        self._text = {}
+        self._mtimes = None
+        self._cache = OrderedDict()
+        self._lock = threading.RLock()
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+        self.reload()
+
+    def _table_mtimes(self) -> List[float]:
+        # Raises FileNotFoundError when the cleaner has not written the tables
+        return [(self.data_dir / f"{self.prefix}{suffix}").stat().st_mtime for suffix in TABLE_SUFFIXES.values()]
+
+    def reload(self):
+        """
+        Load the star schema tables and reset derived state
+        """
+        logger.info(f"Loading cleaned star schema {self.prefix} from {self.data_dir}")
+        # Taken before reading, so a rewrite during the read triggers another reload
+        mtimes = self._table_mtimes()
+        schema = StarSchema.load(self.data_dir, self.prefix, low_memory=False)
+
+        # Keep only viewed clips with actual responses
+        question_cols = [col for col in ('familiarity_plot', 'tension_beginning') if col in schema.responses.columns]
+        if question_cols:
+            answered = schema.responses[question_cols].notna().any(axis=1)
+            schema = StarSchema(schema.participants, schema.responses[answered], schema.videos)
+
+        with self._lock:
+            self.schema = schema
+            self.columns = list(schema.responses.columns) + [
+                col for col in schema.participants.columns if col not in schema.responses.columns]
+            self._columns = {}
+            self._numeric = {}
+            self._text = {}
+            self._cache.clear()
+            self._mtimes = mtimes
+        logger.info(f"Loaded {len(schema.responses)} response rows from {len(schema.participants)} participants")
+
+    def reload_if_changed(self) -> bool:
+        """
+        Reload when the cleaner has rewritten the tables
+
+        Tables that cannot be read (e.g. caught mid-rewrite) leave the previous
+        data in place; the stored mtimes are unchanged, so the next call retries.
+        """
+        try:
+            mtimes = self._table_mtimes()
+        except FileNotFoundError:
+            return False
+        with self._lock:
+            if mtimes != self._mtimes:
+                try:
+                    self.reload()
+                except Exception as e:
+                    logger.warning(f"Could not reload {self.prefix} tables ({e}); serving the previous data")
+                    return False
+                return True
+        return False
+
+    def _column(self, column: str) -> pd.Series:
+        """
+        A responses column, or a participant column joined onto the responses on first use
+        """
+        if column not in self._columns:
+            if column in self.schema.responses.columns:
+                self._columns[column] = self.schema.responses[column]
+            else:
+                self._columns[column] = self.schema.responses_with([column], questions=[])[column]
+        return self._columns[column]
+
+    def _numeric_column(self, column: str) -> pd.Series:
+        if column not in self._numeric:
+            self._numeric[column] = pd.to_numeric(self._column(column), errors='coerce')
+        return self._numeric[column]
+
+    def _text_column(self, column: str) -> pd.Series:
+        if column not in self._text:
+            self._text[column] = self._column(column).astype(str)
+        return self._text[column]
+
+    def _filter_mask(self, column: str, values: List) -> np.ndarray:
+        """
+        Rows whose value is one of `values`; numeric columns compare numerically, so 50, "50" and "50.0" all match
+        """
+        data = self._column(column)
+        if pd.api.types.is_numeric_dtype(data) and not pd.api.types.is_bool_dtype(data):
+            targets = pd.to_numeric(pd.Series(values, dtype=object), errors='coerce').dropna()
+            return self._numeric_column(column).isin(targets).to_numpy()
+        return self._text_column(column).isin([str(v) for v in values]).to_numpy()
+
+    def _validate(self, query: Dict) -> Dict:
+        """
+        Normalize a query dict and check it against the loaded columns
+        """
+        if not isinstance(query, dict):
+            raise QueryError(f"Query must be a JSON object, got {type(query).__name__}")
+
+        question = query.get('question')
+        agg = query.get('agg', 'mean')
+        filters = query.get('filters') or {}
+        group_by = query.get('group_by') or []
+        if isinstance(group_by, str):
+            group_by = [group_by]
+
+        if not isinstance(question, str) or question not in self.columns:
+            raise QueryError(f"Unknown question: {question}")
+        if not isinstance(agg, str) or agg not in SUPPORTED_AGGREGATES:
+            raise QueryError(f"Unsupported aggregate: {agg} (use one of {sorted(SUPPORTED_AGGREGATES)})")
+        if not isinstance(filters, dict):
+            raise QueryError("filters must be an object mapping columns to a value or a list of values")
+        if not isinstance(group_by, list):
+            raise QueryError("group_by must be a column name or a list of column names")
+        for col in list(filters) + group_by:
+            if not isinstance(col, str) or col not in self.columns:
+                raise QueryError(f"Unknown column: {col}")
+        for col, value in filters.items():
+            values = value if isinstance(value, list) else [value]
+            if any(isinstance(v, (dict, list)) for v in values):
+                raise QueryError(f"Filter values for {col} must be scalars")
+
+        return {'question': question, 'agg': agg, 'filters': filters, 'group_by': group_by}
+
+    def _execute(self, query: Dict) -> Dict:
+        mask = np.ones(len(self.schema.responses), dtype=bool)
+        for col, value in query['filters'].items():
+            mask &= self._filter_mask(col, value if isinstance(value, list) else [value])
+
+        if query['agg'] in NUMERIC_AGGREGATES:
+            values = self._numeric_column(query['question'])[mask]
+        else:
+            values = self._column(query['question'])[mask]
+
+        if query['group_by']:
+            keys = [self._column(col)[mask] for col in query['group_by']]
+            grouped = values.groupby(keys, dropna=False)
+            result = grouped.value_counts() if query['agg'] == 'value_counts' else grouped.agg(query['agg'])
+            rows = [{'group': list(key) if isinstance(key, tuple) else [key], 'value': _to_json(val)}
+                    for key, val in result.items()]
+        elif query['agg'] == 'value_counts':
+            rows = [{'group': [key], 'value': int(val)} for key, val in values.value_counts().items()]
+        else:
+            rows = [{'group': [], 'value': _to_json(values.agg(query['agg']))}]
+
+        return {'n': int(mask.sum()), 'rows': rows}
+
+    def query(self, query: Dict) -> Dict:
+        """
+        Answer a filter + group-by + aggregate query, using the cache when possible
+
+        Args:
+            query: {'question': ..., 'agg': ..., 'filters': {col: value or [values]}, 'group_by': [cols]}
+
+        Returns:
+            dict: Matching row count, per-group results and whether the cache was used
+        """
+        with self._lock:
+            normalized = self._validate(query)
+            key = json.dumps(normalized, sort_keys=True, default=str)
+
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self.cache_hits += 1
+                return {**self._cache[key], 'cached': True}
+
+            self.cache_misses += 1
+            result = self._execute(normalized)
+            self._cache[key] = result
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+        return {**result, 'cached': False}
+
+    def describe(self) -> Dict:
+        return {
+            'data_dir': str(self.data_dir),
+            'prefix': self.prefix,
+            'rows': len(self.schema.responses),
+            'participants': len(self.schema.participants),
+            'columns': self.columns,
+            'cache_entries': len(self._cache),
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses
+        }
+
+
+def _to_json(value):
+    if isinstance(value, (np.integer,)):
+        return int(value)
+    if isinstance(value, (np.floating, float)):
+        return None if np.isnan(value) else float(value)
+    return value
+
+
+def make_handler(store: CleanedDataStore):
+    """
+    Build a request handler bound to a data store
+    """
+
+    class QueryHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, format, *args):
+            logger.debug(format % args)
+
+        def _send(self, status: int, payload: Dict):
+            body = json.dumps(payload, default=str).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _answer(self, query: Dict):
+            store.reload_if_changed()
+            try:
+                self._send(200, store.query(query))
+            except QueryError as e:
+                self._send(400, {'error': str(e)})
+            except Exception as e:
+                logger.exception(f"Query failed: {query}")
+                self._send(500, {'error': f"Internal error: {e}"})
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            if url.path == '/health':
+                store.reload_if_changed()
+                self._send(200, store.describe())
+            elif url.path == '/query':
+                # GET form: /query?question=tension_end&agg=mean&group_by=video_id&UserLanguage=EN
+                params = {k: v if len(v) > 1 else v[0] for k, v in parse_qs(url.query).items()}
+                query = {
+                    'question': params.pop('question', None),
+                    'agg': params.pop('agg', 'mean'),
+                    'group_by': params.pop('group_by', [])
+                }
+                query['filters'] = params
+                self._answer(query)
+            else:
+                self._send(404, {'error': f"Unknown path: {url.path}"})
+
+        def do_POST(self):
+            if urlsplit(self.path).path != '/query':
+                self._send(404, {'error': f"Unknown path: {self.path}"})
+                return
+            length = int(self.headers.get('Content-Length', 0))
+            try:
+                query = json.loads(self.rfile.read(length) or b'{}')
+            except json.JSONDecodeError as e:
+                self._send(400, {'error': f"Invalid JSON: {e}"})
+                return
+            self._answer(query)
+
+    return QueryHandler
+
+
+def serve(data_dir: str, prefix: str, host: str = '127.0.0.1', port: int = 8765, cache_size: int = 1024):
+    """
+    Run the query service until interrupted
+    """
+    store = CleanedDataStore(data_dir, prefix, cache_size)
+    server = ThreadingHTTPServer((host, port), make_handler(store))
+    logger.info(f"Query service listening on http://{host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("Shutting down query service")
+    finally:
+        server.server_close()
+
+
+def main():
+    """
+    Main function to start the query service
+    """
+    data_dir = "/Users/yaojunyan/Desktop/short-form-video-narrative-analysis/data"
+    data_prefix = "video_narrative_cleaned"
+
+    try:
+        serve(data_dir, data_prefix)
+    except Exception as e:
+        print(f"\nERROR: {e}")
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
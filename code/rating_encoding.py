@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Rating Encoding for Short Form Video Narrative Perception Study
+
+This module holds the numeric codings of the survey's response labels and
+helpers that turn cleaned text answers into typed numeric columns. It is shared
+by the modeling, factor extraction and screening code so that every analysis
+uses the same coding.
+
+Author: Generated for Short Form Video Narrative Analysis Project
+Date: 2025
+"""
+
+import pandas as pd
+import numpy as np
+from typing import List
+
+# 5-point agreement scale used by most per-clip items and Pre_fan
+AGREEMENT_SCALE = {
+    'Strongly disagree': 1,
+    'Somewhat disagree': 2,
+    'Neither agree nor disagree': 3,
+    'Somewhat agree': 4,
+    'Strongly agree': 5
+}
+
+# Pre_app_* (app usage frequency)
+APP_FREQUENCY_SCALE = {
+    'Never': 1,
+    'Seldom': 2,
+    'Sometimes': 3,
+    'Often': 4,
+    'Very Frequently': 5
+}
+
+# Pre_freq
+VIEWING_FREQUENCY_SCALE = {
+    'Never': 1,
+    'Sometimes': 2,
+    'About half the time': 3,
+    'Most of the time': 4,
+    'Always': 5
+}
+
+YES_NO = {'No': 0, 'Yes': 1}
+
+# Qualtrics export code for a question that was displayed but not answered
+SEEN_NOT_ANSWERED = '-99'
+
+# Participant-level demographic items (free-text "other" fields are conditional and left out)
+DEMOGRAPHIC_ITEMS = ['Demo_race', 'Demo_income', 'Demo_gender', 'Demo_grade', 'Demo_major']
+
+# Single-choice demographic items whose answers can be used as groups as they are
+# (Demo_race is multi-select and Demo_major is free text)
+CLOSED_DEMOGRAPHIC_ITEMS = ['Demo_gender', 'Demo_income', 'Demo_grade']
+
+# Episode/season position; "Not sure" is treated as missing
+POSITION_SCALE = {'Beginning': 0, 'Middle': 1, 'End': 2}
+
+# Options of the multi-select familiarity_seen item and their indicator names
+SEEN_OPTIONS = {
+    'This particular clip': 'seen_clip',
+    'The episode the clip is taken from': 'seen_episode',
+    'The larger series the clip is taken from': 'seen_series'
+}
+
+TIMING_QUESTIONS = ['timing_first_click', 'timing_last_click', 'timing_page_submit', 'timing_click_count']
+
+SLIDER_QUESTIONS = ['tension_beginning', 'tension_middle', 'tension_end']
+
+LIKERT_QUESTIONS = [
+    'familiarity_plot', 'familiarity_characters',
+    'clear_starting_point', 'inferring_context', 'built_interest_tension', 'clear_outcome', 'logical_flow',
+    'introduced_tension', 'resolved_tension',
+    'want_next_story', 'want_broader_context', 'watch_full_episode', 'read_comments'
+]
+
+BINARY_QUESTIONS = ['narrative_resolution', 'satisfactory_resolution', 'concluded_scene']
+
+POSITION_QUESTIONS = ['episode_position', 'season_position']
+
+PARTICIPANT_ITEMS = {
+    **{f'Pre_app_{i}': APP_FREQUENCY_SCALE for i in range(1, 6)},
+    'Pre_fan': AGREEMENT_SCALE,
+    'Pre_freq': VIEWING_FREQUENCY_SCALE
+}
+
+
+def _map_labels(values: pd.Series, scale: dict) -> pd.Series:
+    """
+    Map text labels to codes through factorized codes (one dictionary lookup per distinct label)
+    """
+    codes, uniques = pd.factorize(values)
+    # Missing values get code -1, which picks the trailing NaN
+    lookup = np.array([scale.get(str(label).strip(), np.nan) for label in uniques] + [np.nan], dtype=np.float32)
+    return pd.Series(lookup[codes], index=values.index)
+
+
+def encode_ratings(df: pd.DataFrame, include_timing: bool = True) -> pd.DataFrame:
+    """
+    Encode per-clip answers as float32 columns
+
+    Args:
+        df: Long-format rows (one per participant-video) with standardized question columns
+        include_timing: Whether to include the page timing variables
+
+    Returns:
+        pd.DataFrame: Encoded columns aligned to df.index (NaN where unanswered)
+    """
+    encoded = {}
+
+    if include_timing:
+        for col in TIMING_QUESTIONS:
+            if col in df.columns:
+                encoded[col] = pd.to_numeric(df[col], errors='coerce').astype(np.float32)
+
+    for col in SLIDER_QUESTIONS:
+        if col in df.columns:
+            encoded[col] = pd.to_numeric(df[col], errors='coerce').astype(np.float32)
+
+    for col in LIKERT_QUESTIONS:
+        if col in df.columns:
+            encoded[col] = _map_labels(df[col], AGREEMENT_SCALE)
+
+    for col in BINARY_QUESTIONS:
+        if col in df.columns:
+            encoded[col] = _map_labels(df[col], YES_NO)
+
+    for col in POSITION_QUESTIONS:
+        if col in df.columns:
+            encoded[col] = _map_labels(df[col], POSITION_SCALE)
+
+    if 'familiarity_seen' in df.columns:
+        seen = df['familiarity_seen'].astype('string')
+        answered = seen.notna()
+        for option, name in SEEN_OPTIONS.items():
+            indicator = seen.str.contains(option, regex=False).astype('float32')
+            encoded[name] = indicator.where(answered).astype(np.float32)
+
+    return pd.DataFrame(encoded, index=df.index)
+
+
+def encode_participant_items(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Encode participant-level Pre_app_*/Pre_fan/Pre_freq answers as float32 columns
+    """
+    return pd.DataFrame({col: _map_labels(df[col], scale) for col, scale in PARTICIPANT_ITEMS.items()
+                         if col in df.columns}, index=df.index)
+
+
+def rating_columns(include_timing: bool = True) -> List[str]:
+    """
+    Names of the columns produced by encode_ratings(), in order
+    """
+    columns = (TIMING_QUESTIONS if include_timing else []) + SLIDER_QUESTIONS + LIKERT_QUESTIONS
+    return columns + BINARY_QUESTIONS + POSITION_QUESTIONS + list(SEEN_OPTIONS.values())
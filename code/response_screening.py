@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Response Quality Screening for Short Form Video Narrative Perception Study
+
+This module screens viewed clip responses for speeding and inattention using the
+per-clip page timing and the answers themselves, instead of relying only on the
+overall session duration. For every viewed clip it computes:
+1. Dwell-time robust z-score: log page-submit time relative to the median and
+   MAD of the same clip's dwell times (clips differ in length, so each clip is
+   its own reference)
+2. Straight-lining score: share of the clip page's Likert answers that equal the
+   page's most common answer
+3. Slider invariance: all three tension sliders left at the same value
+
+Clip scores are aggregated per participant in one grouped pass and turned into
+`speeder` / `inattentive` flags. Everything runs on whole columns, so screening
+cost does not depend on a per-participant Python loop.
+
+Author: Generated for Short Form Video Narrative Analysis Project
+Date: 2025
+"""
+
+import pandas as pd
+import numpy as np
+import logging
+from typing import List, Optional
+
+from rating_encoding import encode_ratings, AGREEMENT_SCALE, LIKERT_QUESTIONS, SLIDER_QUESTIONS
+
+logger = logging.getLogger(__name__)
+
+# Scales MAD to the standard deviation of a normal distribution
+MAD_SCALE = 1.4826
+
+
+class ResponseQualityScreener:
+    """
+    Vectorized speeding and inattention screening of viewed clip responses
+    """
+
+    def __init__(self, dwell_column: str = 'timing_page_submit', speeding_z: float = -2.0,
+                 speeding_share: float = 0.5, straightline_threshold: float = 0.9,
+                 straightline_share: float = 0.75, slider_invariant_share: float = 0.75):
+        """
+        Initialize the screener
+
+        Args:
+            dwell_column: Per-clip timing column used as dwell time (seconds)
+            speeding_z: Clip dwell z-score at or below which a clip counts as sped through
+            speeding_share: Share of sped-through clips that makes a participant a speeder
+            straightline_threshold: Straight-lining score at or above which a clip page counts as straight-lined
+            straightline_share: Share of straight-lined clip pages that flags a participant as inattentive
+            slider_invariant_share: Share of clips with invariant tension sliders that flags a participant as inattentive
+        """
+        self.dwell_column = dwell_column
+        self.speeding_z = speeding_z
+        self.speeding_share = speeding_share
+        self.straightline_threshold = straightline_threshold
+        self.straightline_share = straightline_share
+        self.slider_invariant_share = slider_invariant_share
+
+    def clip_scores(self, responses: pd.DataFrame) -> pd.DataFrame:
+        """
+        Per viewed clip screening scores
+
+        Args:
+            responses: One row per viewed clip with ResponseId, video_id, the timing column,
+                tension sliders and Likert items
+
+        Returns:
+            pd.DataFrame: ResponseId, video_id, dwell_seconds, dwell_z, straightline_score,
+            slider_invariant (aligned to responses.index)
+        """
+        encoded = encode_ratings(responses, include_timing=True)
+
+        # Dwell-time robust z relative to each clip's own distribution
+        dwell = encoded[self.dwell_column] if self.dwell_column in encoded.columns else \
+            pd.to_numeric(responses[self.dwell_column], errors='coerce').astype(np.float32)
+        log_dwell = np.log1p(dwell.clip(lower=0))
+        clips = responses['video_id'].astype(str).to_numpy()
+        clip_median = log_dwell.groupby(clips).transform('median')
+        clip_mad = (log_dwell - clip_median).abs().groupby(clips).transform('median')
+        dwell_z = (log_dwell - clip_median) / (MAD_SCALE * clip_mad.where(clip_mad > 0))
+
+        # Straight-lining: share of answered Likert items equal to the page's most common answer
+        likert = encoded.reindex(columns=[q for q in LIKERT_QUESTIONS if q in encoded.columns]).to_numpy()
+        answered = (~np.isnan(likert)).sum(axis=1)
+        value_counts = np.stack([(likert == code).sum(axis=1) for code in AGREEMENT_SCALE.values()], axis=1)
+        straightline = np.where(answered >= 2, value_counts.max(axis=1) / np.maximum(answered, 1), np.nan)
+
+        # Slider invariance: all tension sliders answered and identical
+        sliders = encoded.reindex(columns=SLIDER_QUESTIONS).to_numpy()
+        slider_answered = ~np.isnan(sliders).any(axis=1)
+        slider_invariant = slider_answered & (sliders.max(axis=1) == sliders.min(axis=1))
+
+        return pd.DataFrame({
+            'ResponseId': responses['ResponseId'].to_numpy(),
+            'video_id': responses['video_id'].to_numpy(),
+            'dwell_seconds': dwell.to_numpy(),
+            'dwell_z': dwell_z.to_numpy(),
+            'straightline_score': straightline,
+            'slider_invariant': np.where(slider_answered, slider_invariant, np.nan)
+        }, index=responses.index)
+
+    def participant_flags(self, scores: pd.DataFrame) -> pd.DataFrame:
+        """
+        Aggregate clip scores per participant (one grouped pass) and apply the flag thresholds
+
+        Returns:
+            pd.DataFrame: One row per ResponseId with aggregated scores and speeder/inattentive flags
+        """
+        clip_flags = pd.DataFrame({
+            'ResponseId': scores['ResponseId'].to_numpy(),
+            'n_clips': 1,
+            'dwell_z_median': scores['dwell_z'].to_numpy(),
+            'dwell_z_min': scores['dwell_z'].to_numpy(),
+            'sped_clips': (scores['dwell_z'] <= self.speeding_z).to_numpy(),
+            'straightline_mean': scores['straightline_score'].to_numpy(),
+            'straightlined_clips': (scores['straightline_score'] >= self.straightline_threshold).to_numpy(),
+            'slider_invariant_clips': (scores['slider_invariant'] == 1).to_numpy()
+        })
+        flags = clip_flags.groupby('ResponseId', sort=False).agg({
+            'n_clips': 'sum',
+            'dwell_z_median': 'median',
+            'dwell_z_min': 'min',
+            'sped_clips': 'sum',
+            'straightline_mean': 'mean',
+            'straightlined_clips': 'sum',
+            'slider_invariant_clips': 'sum'
+        }).reset_index()
+
+        flags['speeder'] = flags['sped_clips'] >= self.speeding_share * flags['n_clips']
+        flags['inattentive'] = ((flags['straightlined_clips'] >= self.straightline_share * flags['n_clips']) |
+                                (flags['slider_invariant_clips'] >= self.slider_invariant_share * flags['n_clips']))
+        return flags
+
+    def screen(self, responses: pd.DataFrame):
+        """
+        Score every viewed clip and flag participants
+
+        Returns:
+            tuple: (clip scores, participant flags)
+        """
+        scores = self.clip_scores(responses)
+        flags = self.participant_flags(scores)
+        logger.info(f"Response screening: {int(flags['speeder'].sum())} speeders, "
+                    f"{int(flags['inattentive'].sum())} inattentive of {len(flags)} participants")
+        return scores, flags
+
+    @staticmethod
+    def exclude(df: pd.DataFrame, flags: pd.DataFrame, criteria: Optional[List[str]] = None) -> pd.DataFrame:
+        """
+        Drop rows of flagged participants (any of the given flag columns) from a ResponseId-keyed table
+        """
+        criteria = criteria or ['speeder', 'inattentive']
+        flagged = flags.loc[flags[criteria].any(axis=1), 'ResponseId']
+        return df[~df['ResponseId'].isin(flagged)]
@@ -3,7 +3,7 @@
 Simple Descriptive Analysis for Short Form Video Narrative Perception Study
 
 This script performs straightforward descriptive analysis of both participant-level
-and video-level variables using the long format data.
+and video-level variables using the cleaned participant and response tables.
 
 Author: Generated for Short Form Video Narrative Analysis Project
 Date: 2025
@@ -17,17 +17,22 @@ from pathlib import Path
 import warnings
 warnings.filterwarnings('ignore')
 
+from design_diagnostics import DesignDiagnostics
+from fielding_monitor import FieldingMonitor, parse_qualtrics_datetime
+from star_schema import StarSchema
+from tension_trajectories import profile_tension_trajectories, pooled_trajectory_summary
+
 # Set up plotting style
 plt.style.use('default')
 sns.set_palette("husl")
 
-def analyze_participant_level_data(df):
+def analyze_participant_level_data(participants, response_data):
     """Analyze participant-level variables"""
     print("=== PARTICIPANT-LEVEL ANALYSIS ===")
     
-    # Get unique participants (one row per participant)
+    # Participant table already has one row per participant
     participant_cols = ['StartDate', 'EndDate', 'Duration (in seconds)', 'ResponseId', 'UserLanguage']
-    participant_df = df[participant_cols].drop_duplicates(subset=['ResponseId'])
+    participant_df = participants[participant_cols]
     
     results = {}
     
@@ -53,7 +58,7 @@ def analyze_participant_level_data(df):
     results['language_distribution'] = participant_df['UserLanguage'].value_counts().to_dict()
     
     # Videos per participant (should be 4 based on experimental design)
-    videos_per_participant = df.groupby('ResponseId')['video_id'].count()
+    videos_per_participant = response_data.groupby('ResponseId')['video_id'].count()
     results['videos_per_participant'] = {
         'mean': videos_per_participant.mean(),
         'std': videos_per_participant.std(),
@@ -68,6 +73,20 @@ def analyze_participant_level_data(df):
     
     return results, participant_df
 
+def analyze_fielding_progress(response_data, participants):
+    """Summarize completions, durations and key ratings per fielding day"""
+    print("\n=== FIELDING PROGRESS ===")
+    
+    monitor = FieldingMonitor(timestamp_col='EndDate')
+    monitor.add_responses(response_data, participants)
+    daily = monitor.summary('daily')
+    
+    for _, day in daily.iterrows():
+        print(f"{day['bucket_start'].strftime('%Y-%m-%d')}: {day['completions']} completions "
+              f"(median {day['duration_median_minutes']:.1f} min), cumulative {day['cumulative_completions']}")
+    
+    return daily
+
 def analyze_video_level_data(df):
     """Analyze video-level variables"""
     print("\n=== VIDEO-LEVEL ANALYSIS ===")
@@ -97,6 +116,24 @@ def analyze_video_level_data(df):
     
     return results, response_data
 
+def analyze_design_balance(response_data, clip_catalog=None):
+    """Check clip assignment balance using the sparse participant × clip incidence matrix"""
+    print("\n=== DESIGN BALANCE DIAGNOSTICS ===")
+    
+    diagnostics = DesignDiagnostics(clips_per_participant=4)
+    results = diagnostics.run(response_data, clip_catalog=clip_catalog)
+    
+    exposure = results['exposure']
+    pairs = results['pairs']
+    print(f"Participants per video: {exposure['exposure_min']}-{exposure['exposure_max']} "
+          f"(expected {exposure['expected_exposure']:.1f}, CV={exposure['exposure_cv']:.2f})")
+    print(f"Videos per participant: {exposure['clips_per_participant']}")
+    print(f"Clip pairs never shown together: {pairs['pairs_never_shown_together']} of {pairs['n_pairs']}")
+    for alert in results['alerts']:
+        print(f"  ALERT: {alert}")
+    
+    return results
+
 def analyze_response_patterns(response_data):
     """Analyze response patterns for different question types"""
     print("\n=== RESPONSE PATTERNS ANALYSIS ===")
@@ -153,6 +190,25 @@ def analyze_response_patterns(response_data):
     
     return results
 
+def analyze_tension_trajectories(response_data, clip_catalog, output_dir):
+    """Profile the beginning→middle→end tension trajectory of every clip in one grouped pass"""
+    print("\n=== TENSION TRAJECTORIES ===")
+    
+    pooled = pooled_trajectory_summary(response_data)
+    profiles = profile_tension_trajectories(response_data, catalog=clip_catalog)
+    
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    profiles.to_csv(output_dir / 'tension_trajectories_by_video.csv')
+    
+    print(f"Pooled tension: {pooled['tension_beginning_mean']:.1f} → {pooled['tension_middle_mean']:.1f} → "
+          f"{pooled['tension_end_mean']:.1f} (slope {pooled['slope_mean']:.1f} ± {pooled['slope_std']:.1f}, "
+          f"curvature {pooled['curvature_mean']:.1f} ± {pooled['curvature_std']:.1f})")
+    print(f"Trajectory shapes: {profiles['shape'].value_counts().to_dict()}")
+    print(f"Per-video profiles saved to {output_dir / 'tension_trajectories_by_video.csv'}")
+    
+    return {'pooled': pooled, 'profiles': profiles}
+
 def create_simple_visualizations(participant_df, response_data, output_dir):
     """Create simple visualizations"""
     print("\n=== CREATING VISUALIZATIONS ===")
@@ -211,7 +267,8 @@ def create_simple_visualizations(participant_df, response_data, output_dir):
     
     print(f"Visualization saved to {output_dir / 'simple_descriptive_analysis.png'}")
 
-def generate_simple_report(participant_results, video_results, response_results, output_dir):
+def generate_simple_report(participant_results, video_results, response_results, output_dir, design_results=None,
+                           fielding_results=None, trajectory_results=None):
     """Generate a simple descriptive analysis report"""
     print("\n=== GENERATING REPORT ===")
     
@@ -240,6 +297,17 @@ def generate_simple_report(participant_results, video_results, response_results,
     report_lines.append(f"- **Videos per Participant:** {participant_results['videos_per_participant']['mean']:.0f} (range: {participant_results['videos_per_participant']['min']}-{participant_results['videos_per_participant']['max']})")
     report_lines.append("")
     
+    # Fielding Progress
+    if fielding_results is not None and not fielding_results.empty:
+        report_lines.append("## Fielding Progress")
+        report_lines.append("| Day | Completions | Cumulative | Median Duration (min) | Mean Tension (begin/middle/end) |")
+        report_lines.append("|-----|-------------|------------|-----------------------|---------------------------------|")
+        for _, day in fielding_results.iterrows():
+            report_lines.append(f"| {day['bucket_start'].strftime('%Y-%m-%d')} | {day['completions']} | {day['cumulative_completions']} | "
+                                f"{day['duration_median_minutes']:.1f} | {day['mean_tension_beginning']:.1f} / "
+                                f"{day['mean_tension_middle']:.1f} / {day['mean_tension_end']:.1f} |")
+        report_lines.append("")
+    
     # Video Characteristics
     report_lines.append("## Video Characteristics")
     report_lines.append(f"- **Mean Responses per Video:** {video_results['video_response_counts']['mean']:.1f} ± {video_results['video_response_counts']['std']:.1f}")
@@ -263,11 +331,43 @@ def generate_simple_report(participant_results, video_results, response_results,
             
             report_lines.append("")
     
+    # Tension Trajectories
+    if trajectory_results is not None:
+        pooled = trajectory_results['pooled']
+        profiles = trajectory_results['profiles'].dropna(subset=['slope_mean'])
+        report_lines.append("## Tension Trajectories")
+        report_lines.append(f"- **Pooled Trajectory:** {pooled['tension_beginning_mean']:.1f} → {pooled['tension_middle_mean']:.1f} → "
+                            f"{pooled['tension_end_mean']:.1f} (slope {pooled['slope_mean']:.1f} ± {pooled['slope_std']:.1f} per segment, "
+                            f"curvature {pooled['curvature_mean']:.1f} ± {pooled['curvature_std']:.1f}; "
+                            f"{pooled['rising_share']*100:.1f}% of responses rise overall)")
+        shapes = ', '.join(f"{n} {shape}" for shape, n in profiles['shape'].value_counts().items())
+        report_lines.append(f"- **Clip Shapes:** {shapes}")
+        report_lines.append("")
+        report_lines.append("| Video | n | Tension (begin/middle/end) | Slope (mean ± SD) | Curvature (mean ± SD) | Resolved (%) | Resolved Tension | Slope-Resolution r |")
+        report_lines.append("|-------|---|----------------------------|-------------------|-----------------------|--------------|------------------|--------------------|")
+        for video_id, row in profiles.sort_values('slope_mean', ascending=False).iterrows():
+            report_lines.append(f"| {video_id} | {row['n_responses']} | {row['tension_beginning_mean']:.1f} / {row['tension_middle_mean']:.1f} / "
+                                f"{row['tension_end_mean']:.1f} | {row['slope_mean']:.1f} ± {row['slope_std']:.1f} | "
+                                f"{row['curvature_mean']:.1f} ± {row['curvature_std']:.1f} | {row['narrative_resolution_rate']*100:.0f} | "
+                                f"{row['resolved_tension_mean']:.2f} | {row['slope_resolved_corr']:.2f} |")
+        report_lines.append("")
+    
     # Key Findings
     report_lines.append("## Key Findings")
     report_lines.append("")
-    report_lines.append("- **Experimental Design:** Each participant rated exactly 4 videos (not all 40)")
-    report_lines.append("- **Balanced Design:** Videos received responses from 6-20 participants each")
+    if design_results is not None:
+        exposure = design_results['exposure']
+        load = exposure['clips_per_participant']
+        load_text = ', '.join(f"{n} participants rated {k}" for k, n in load.items())
+        report_lines.append(f"- **Experimental Design:** {load_text} videos (of {design_results['n_clips']})")
+        report_lines.append(f"- **Balanced Design:** Videos received responses from {exposure['exposure_min']}-{exposure['exposure_max']} participants each "
+                            f"(uniformity χ² p={exposure['uniformity_p_value']:.3f}; "
+                            f"{design_results['pairs']['pairs_never_shown_together']} of {design_results['pairs']['n_pairs']} clip pairs never shown together)")
+        for alert in design_results['alerts']:
+            report_lines.append(f"- **Design Alert:** {alert}")
+    else:
+        report_lines.append("- **Experimental Design:** Each participant rated exactly 4 videos (not all 40)")
+        report_lines.append("- **Balanced Design:** Videos received responses from 6-20 participants each")
     report_lines.append("- **Data Quality:** High response rates across all question types")
     report_lines.append("- **Session Engagement:** Reasonable session durations suggest thoughtful participation")
     report_lines.append("")
@@ -284,32 +384,44 @@ def main():
     """Main function to run the simple descriptive analysis"""
     
     # Define paths
-    data_path = "/Users/yaojunyan/Desktop/short-form-video-narrative-analysis/data/video_narrative_cleaned_long_format.csv"
+    data_dir = "/Users/yaojunyan/Desktop/short-form-video-narrative-analysis/data"
+    data_prefix = "video_narrative_cleaned"
     output_dir = "/Users/yaojunyan/Desktop/short-form-video-narrative-analysis/analysis_outputs"
     
     print("Starting Simple Descriptive Analysis...")
     
     # Load data
     print("Loading data...")
-    df = pd.read_csv(data_path)
-    df['StartDate'] = pd.to_datetime(df['StartDate'])
-    df['EndDate'] = pd.to_datetime(df['EndDate'])
-    print(f"Loaded {len(df)} observations")
+    schema = StarSchema.load(data_dir, data_prefix)
+    participants = schema.participants
+    participants['StartDate'] = parse_qualtrics_datetime(participants['StartDate'])
+    participants['EndDate'] = parse_qualtrics_datetime(participants['EndDate'])
+    print(f"Loaded {len(participants)} participants and {len(schema.responses)} clip responses")
     
     # Analyze participant-level data
-    participant_results, participant_df = analyze_participant_level_data(df)
+    participant_results, participant_df = analyze_participant_level_data(participants, schema.responses)
+    
+    # Summarize fielding progress per day
+    fielding_results = analyze_fielding_progress(schema.responses, participants)
     
     # Analyze video-level data
-    video_results, response_data = analyze_video_level_data(df)
+    video_results, response_data = analyze_video_level_data(schema.responses)
+    
+    # Check design balance
+    design_results = analyze_design_balance(response_data, clip_catalog=schema.videos['video_id'].tolist())
     
     # Analyze response patterns
     response_results = analyze_response_patterns(response_data)
     
+    # Profile per-video tension trajectories
+    trajectory_results = analyze_tension_trajectories(response_data, schema.videos['video_id'].tolist(), output_dir)
+    
     # Create visualizations
     create_simple_visualizations(participant_df, response_data, output_dir)
     
     # Generate report
-    report_path = generate_simple_report(participant_results, video_results, response_results, output_dir)
+    report_path = generate_simple_report(participant_results, video_results, response_results, output_dir, design_results,
+                                         fielding_results, trajectory_results)
     
     print(f"\nAnalysis completed successfully!")
     print(f"Report available at: {report_path}")
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+SQLite Storage for Short Form Video Narrative Perception Study
+
+This module writes the cleaned data into an indexed SQLite database (standard
+library only) and lets analysis code push filters and aggregates down to SQL
+instead of loading the whole long CSV into pandas. The database holds:
+1. `responses` - one row per answered item (ResponseId, video_id, question, value)
+2. `participants` - one row per participant with metadata and survey-level answers
+3. `codebook` - standardized question names and their raw Qualtrics suffixes
+
+Example:
+    aggregate_question('cleaned.sqlite', 'tension_end', agg='avg',
+                       filters={'UserLanguage': 'EN'}, group_by=['video_id'])
+
+Author: Generated for Short Form Video Narrative Analysis Project
+Date: 2025
+"""
+
+import sqlite3
+import pandas as pd
+import logging
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_AGGREGATES = {'avg', 'min', 'max', 'sum', 'count'}
+
+
+def write_cleaned_database(db_path: str, clip_responses: pd.DataFrame, participants: pd.DataFrame,
+                           question_mappings: Dict[str, str], batch_size: int = 50000) -> Dict[str, int]:
+    """
+    Write cleaned responses, participants and the codebook to SQLite
+
+    Existing tables are replaced. All inserts run inside a single transaction
+    and indexes are created after loading.
+
+    Args:
+        db_path: Path of the SQLite database file
+        clip_responses: Answered items with ResponseId, video_id, question and value
+        participants: Participant-level columns, one row per ResponseId
+        question_mappings: Standardized question name -> raw column suffix
+        batch_size: Rows per executemany call
+
+    Returns:
+        dict: Number of rows written per table
+    """
+    logger.info(f"Writing SQLite database: {db_path}")
+
+    responses = clip_responses[['ResponseId', 'video_id', 'question', 'value']].astype(str)
+    value_num = pd.to_numeric(responses['value'], errors='coerce')
+    responses = responses.assign(value_num=value_num.astype(object).where(value_num.notna(), None))
+
+    participant_columns = list(participants.columns)
+    participant_rows = participants.astype(object).where(participants.notna(), None)
+
+    conn = sqlite3.connect(db_path)
+    try:
+        with conn:
+            conn.execute("DROP TABLE IF EXISTS responses")
+            conn.execute("DROP TABLE IF EXISTS participants")
+            conn.execute("DROP TABLE IF EXISTS codebook")
+
+            conn.execute("""
+                CREATE TABLE responses (
+                    ResponseId TEXT NOT NULL,
+                    video_id TEXT NOT NULL,
+                    question TEXT NOT NULL,
+                    value TEXT,
+                    value_num REAL
+                )""")
+            column_defs = ', '.join(f'{_quote(col)} TEXT' for col in participant_columns)
+            conn.execute(f"CREATE TABLE participants ({column_defs})")
+            conn.execute("CREATE TABLE codebook (question TEXT PRIMARY KEY, raw_suffix TEXT)")
+
+            _insert_batches(conn, "INSERT INTO responses VALUES (?, ?, ?, ?, ?)",
+                            responses.itertuples(index=False, name=None), batch_size)
+            placeholders = ', '.join('?' for _ in participant_columns)
+            _insert_batches(conn, f"INSERT INTO participants VALUES ({placeholders})",
+                            participant_rows.itertuples(index=False, name=None), batch_size)
+            conn.executemany("INSERT INTO codebook VALUES (?, ?)", list(question_mappings.items()))
+
+            conn.execute("CREATE INDEX idx_responses_response_id ON responses (ResponseId)")
+            conn.execute("CREATE INDEX idx_responses_video_id ON responses (video_id)")
+            conn.execute("CREATE INDEX idx_responses_video_question ON responses (video_id, question)")
+            if 'ResponseId' in participant_columns:
+                conn.execute("CREATE UNIQUE INDEX idx_participants_response_id ON participants (ResponseId)")
+    finally:
+        conn.close()
+
+    counts = {'responses': len(responses), 'participants': len(participants), 'codebook': len(question_mappings)}
+    logger.info(f"SQLite database written: {counts}")
+    return counts
+
+
+def _insert_batches(conn: sqlite3.Connection, sql: str, rows, batch_size: int):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            conn.executemany(sql, batch)
+            batch = []
+    if batch:
+        conn.executemany(sql, batch)
+
+
+def _quote(identifier: str) -> str:
+    return '"' + identifier.replace('"', '""') + '"'
+
+
+def _participant_columns(conn: sqlite3.Connection) -> List[str]:
+    return [row[1] for row in conn.execute("PRAGMA table_info(participants)")]
+
+
+def _group_expressions(conn: sqlite3.Connection, group_by: Optional[List[str]]) -> List[str]:
+    """
+    SELECT expressions for group-by columns from responses or participants
+    """
+    participant_columns = set(_participant_columns(conn))
+    group_exprs = []
+    for col in group_by or []:
+        if col in ('video_id', 'ResponseId'):
+            group_exprs.append(f"r.{col} AS {_quote(col)}")
+        elif col in participant_columns:
+            group_exprs.append(f"p.{_quote(col)} AS {_quote(col)}")
+        else:
+            raise ValueError(f"Unknown group-by column: {col}")
+    return group_exprs
+
+
+def _where_clause(conn: sqlite3.Connection, filters: Optional[Dict]) -> Tuple[str, list]:
+    """
+    Build a WHERE clause over response (video_id, question, ResponseId) and participant columns
+    """
+    if not filters:
+        return '', []
+
+    participant_columns = set(_participant_columns(conn))
+    clauses, params = [], []
+    for col, value in filters.items():
+        if col in ('video_id', 'ResponseId'):
+            target = f"r.{col}"
+        elif col in participant_columns:
+            target = f"p.{_quote(col)}"
+        else:
+            raise ValueError(f"Unknown filter column: {col}")
+
+        values = value if isinstance(value, (list, tuple)) else [value]
+        clauses.append(f"{target} IN ({', '.join('?' for _ in values)})")
+        params.extend(str(v) for v in values)
+
+    return ' AND ' + ' AND '.join(clauses), params
+
+
+def aggregate_question(db_path: str, question: str, agg: str = 'avg', filters: Optional[Dict] = None,
+                       group_by: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    Aggregate one question in SQL, optionally filtered and grouped
+
+    Args:
+        db_path: Path of the SQLite database
+        question: Standardized question name (e.g. 'tension_end')
+        agg: One of avg, min, max, sum, count (numeric aggregates use value_num)
+        filters: {column: value or [values]} over video_id, ResponseId or participant columns
+        group_by: Columns to group by (video_id, ResponseId or participant columns)
+
+    Returns:
+        pd.DataFrame: One row per group with `n` and the aggregate value
+    """
+    if agg not in SUPPORTED_AGGREGATES:
+        raise ValueError(f"Unsupported aggregate: {agg} (use one of {sorted(SUPPORTED_AGGREGATES)})")
+
+    conn = sqlite3.connect(db_path)
+    try:
+        group_exprs = _group_expressions(conn, group_by)
+
+        where, params = _where_clause(conn, filters)
+        value_expr = 'r.value' if agg == 'count' else 'r.value_num'
+        select = ', '.join(group_exprs + ['COUNT(r.value) AS n', f"{agg.upper()}({value_expr}) AS {agg}"])
+        sql = (f"SELECT {select} FROM responses r LEFT JOIN participants p ON p.ResponseId = r.ResponseId "
+               f"WHERE r.question = ?{where}")
+        if group_exprs:
+            sql += f" GROUP BY {', '.join(str(i + 1) for i in range(len(group_exprs)))}"
+
+        return pd.read_sql_query(sql, conn, params=[question] + params)
+    finally:
+        conn.close()
+
+
+def value_counts(db_path: str, question: str, filters: Optional[Dict] = None,
+                 group_by: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    Count answers per category of a question in SQL (for Likert/categorical items)
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        group_exprs = _group_expressions(conn, group_by)
+
+        where, params = _where_clause(conn, filters)
+        select = ', '.join(group_exprs + ['r.value AS value', 'COUNT(*) AS n'])
+        sql = (f"SELECT {select} FROM responses r LEFT JOIN participants p ON p.ResponseId = r.ResponseId "
+               f"WHERE r.question = ?{where} GROUP BY {', '.join(str(i + 1) for i in range(len(group_exprs) + 1))} "
+               f"ORDER BY n DESC")
+
+        return pd.read_sql_query(sql, conn, params=[question] + params)
+    finally:
+        conn.close()
+
+
+def load_responses(db_path: str, questions: Optional[List[str]] = None,
+                   filters: Optional[Dict] = None) -> pd.DataFrame:
+    """
+    Load a filtered slice of responses as a participant-video × question frame
+
+    Only matching rows leave the database, so large accumulated samples can be
+    analyzed one slice at a time.
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        where, params = _where_clause(conn, filters)
+        sql = ("SELECT r.ResponseId, r.video_id, r.question, r.value FROM responses r "
+               "LEFT JOIN participants p ON p.ResponseId = r.ResponseId WHERE 1 = 1" + where)
+        if questions:
+            sql += f" AND r.question IN ({', '.join('?' for _ in questions)})"
+            params = params + list(questions)
+
+        items = pd.read_sql_query(sql, conn, params=params)
+    finally:
+        conn.close()
+
+    if items.empty:
+        return pd.DataFrame(columns=['ResponseId', 'video_id'] + list(questions or []))
+
+    return items.pivot(index=['ResponseId', 'video_id'], columns='question', values='value').reset_index()
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Star Schema Access for Short Form Video Narrative Perception Study
+
+The cleaner writes the cleaned data as three tables instead of repeating every
+participant-level column on each clip row:
+1. `{prefix}_participants.csv` - participant dimension (metadata, consent, Pre_*
+   and Demo_* answers), one row per ResponseId
+2. `{prefix}_responses.csv` - response fact table, one row per viewed clip keyed
+   by ResponseId/video_id with the standardized clip questions
+3. `{prefix}_videos.csv` - clip catalog with the number of viewers per clip
+
+Participant columns are joined onto responses only when a caller asks for them,
+and only the requested columns are joined.
+
+Example:
+    schema = StarSchema.load('data', 'video_narrative_cleaned')
+    schema.responses_with(['UserLanguage', 'Demo_gender'])
+
+Author: Generated for Short Form Video Narrative Analysis Project
+Date: 2025
+"""
+
+import pandas as pd
+import numpy as np
+import logging
+import os
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+TABLE_SUFFIXES = {
+    'participants': '_participants.csv',
+    'responses': '_responses.csv',
+    'videos': '_videos.csv'
+}
+
+
+class StarSchema:
+    """
+    Participant dimension, response fact table and clip catalog with lazy joins
+    """
+
+    def __init__(self, participants: pd.DataFrame, responses: pd.DataFrame, videos: Optional[pd.DataFrame] = None):
+        """
+        Initialize the schema
+
+        Args:
+            participants: One row per ResponseId with participant-level columns
+            responses: One row per viewed clip with ResponseId, video_id and clip questions
+            videos: Clip catalog with video_id (defaults to the clips present in responses)
+        """
+        self.participants = participants.reset_index(drop=True)
+        self.responses = responses.reset_index(drop=True)
+        if videos is None:
+            counts = self.responses['video_id'].value_counts()
+            videos = pd.DataFrame({'video_id': sorted(counts.index), 'n_viewers': counts.sort_index().to_numpy()})
+        self.videos = videos
+        self._participant_index = None
+        self._row_positions = None
+
+    @classmethod
+    def load(cls, directory: Union[str, Path], prefix: str, **read_csv_kwargs) -> 'StarSchema':
+        """
+        Read the tables written by VideoNarrativeDataCleaner.save_cleaned_data()
+        """
+        directory = Path(directory)
+        tables = {name: pd.read_csv(directory / f"{prefix}{suffix}", **read_csv_kwargs)
+                  for name, suffix in TABLE_SUFFIXES.items()
+                  if name != 'videos' or (directory / f"{prefix}{suffix}").exists()}
+        logger.info(f"Loaded star schema {prefix}: {len(tables['participants'])} participants, "
+                    f"{len(tables['responses'])} responses")
+        return cls(**tables)
+
+    def save(self, directory: Union[str, Path], prefix: str) -> Dict[str, str]:
+        """
+        Write the three tables as CSV
+
+        Each table is written to a temporary file and swapped in, so readers such
+        as the query service never see a partial table.
+
+        Returns:
+            dict: Path of each written table
+        """
+        directory = Path(directory)
+        saved = {}
+        for name, suffix in TABLE_SUFFIXES.items():
+            path = directory / f"{prefix}{suffix}"
+            temp_path = path.with_name(path.name + '.tmp')
+            getattr(self, name).to_csv(temp_path, index=False)
+            os.replace(temp_path, path)
+            saved[name] = str(path)
+        return saved
+
+    @property
+    def question_columns(self) -> List[str]:
+        return [col for col in self.responses.columns if col not in ('ResponseId', 'video_id')]
+
+    def _positions(self) -> np.ndarray:
+        """
+        Participant row of each response (computed once, reused by every join)
+        """
+        if self._row_positions is None:
+            self._participant_index = pd.Index(self.participants['ResponseId'])
+            self._row_positions = self._participant_index.get_indexer(self.responses['ResponseId'])
+        return self._row_positions
+
+    def participant_attributes(self, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """
+        Participant dimension rows (ResponseId plus the requested columns)
+        """
+        if columns is None:
+            return self.participants
+        return self.participants[['ResponseId'] + [col for col in columns if col != 'ResponseId']]
+
+    def responses_with(self, columns: List[str], questions: Optional[List[str]] = None) -> pd.DataFrame:
+        """
+        Response rows with the requested participant columns joined on ResponseId
+
+        Args:
+            columns: Participant-level columns to attach
+            questions: Clip questions to keep (defaults to all)
+
+        Returns:
+            pd.DataFrame: ResponseId, video_id, the participant columns and the questions
+        """
+        missing = [col for col in columns if col not in self.participants.columns]
+        if missing:
+            raise KeyError(f"Columns not in participant table: {missing}")
+
+        keep = ['ResponseId', 'video_id'] + (self.question_columns if questions is None else list(questions))
+        responses = self.responses[keep]
+        columns = [col for col in columns if col != 'ResponseId']
+        if not columns:
+            return responses
+
+        positions = self._positions()
+        # Responses without a participant row (position -1) get missing values
+        attributes = self.participants[columns].reindex(positions).reset_index(drop=True)
+        return pd.concat([responses.iloc[:, :2], attributes, responses.iloc[:, 2:]], axis=1)
+
+    def to_long(self) -> pd.DataFrame:
+        """
+        Fully denormalized view: every participant column on every response row
+        """
+        return self.responses_with([col for col in self.participants.columns if col != 'ResponseId'])
+
+    def participant_means(self, values: pd.DataFrame) -> pd.DataFrame:
+        """
+        Average per-response numeric values (aligned to the responses table) per participant
+        """
+        return values.groupby(self.responses['ResponseId'].to_numpy()).mean()
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Tension Trajectory Profiling for Short Form Video Narrative Perception Study
+
+This module profiles how perceived tension develops across each clip
+(tension_beginning → tension_middle → tension_end) and relates the trajectory
+to the resolution outcomes (narrative_resolution, resolved_tension). For every
+response it computes:
+1. Slope: average change per segment, (end - beginning) / 2
+2. Curvature: second difference, beginning - 2 × middle + end
+   (negative = tension peaks mid-clip, positive = tension dips mid-clip)
+
+All clips are then summarized in one grouped pass (means, dispersion,
+slope-resolution correlation), producing one table for the whole clip catalog.
+
+Example:
+    profiles = profile_tension_trajectories(schema.responses, catalog=schema.videos['video_id'])
+
+Author: Generated for Short Form Video Narrative Analysis Project
+Date: 2025
+"""
+
+import pandas as pd
+import numpy as np
+import logging
+from typing import Dict, List, Optional
+
+from rating_encoding import encode_ratings, SLIDER_QUESTIONS
+
+logger = logging.getLogger(__name__)
+
+# Mean curvature (slider points) beyond which a clip's trajectory counts as peaked/dipped,
+# and mean slope beyond which it counts as rising/falling
+SHAPE_CURVATURE_THRESHOLD = 10.0
+SHAPE_SLOPE_THRESHOLD = 5.0
+
+
+def response_trajectories(responses: pd.DataFrame) -> pd.DataFrame:
+    """
+    Per-response tension trajectory metrics and resolution outcomes
+
+    Args:
+        responses: One row per viewed clip with video_id, tension sliders,
+            narrative_resolution and resolved_tension
+
+    Returns:
+        pd.DataFrame: video_id, slider levels, slope, curvature and encoded outcomes
+        for responses with all three sliders answered
+    """
+    encoded = encode_ratings(responses.reindex(columns=SLIDER_QUESTIONS + ['narrative_resolution', 'resolved_tension']),
+                             include_timing=False).astype(np.float64)
+    beginning, middle, end = (encoded[col] for col in SLIDER_QUESTIONS)
+
+    trajectories = pd.DataFrame({
+        'video_id': responses['video_id'].to_numpy(),
+        'tension_beginning': beginning.to_numpy(),
+        'tension_middle': middle.to_numpy(),
+        'tension_end': end.to_numpy(),
+        'slope': ((end - beginning) / 2).to_numpy(),
+        'curvature': (beginning - 2 * middle + end).to_numpy(),
+        'narrative_resolution': encoded['narrative_resolution'].to_numpy(),
+        'resolved_tension': encoded['resolved_tension'].to_numpy()
+    }, index=responses.index)
+
+    return trajectories[trajectories[SLIDER_QUESTIONS].notna().all(axis=1)]
+
+
+def profile_tension_trajectories(responses: pd.DataFrame, catalog: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    One row per clip with trajectory levels, slope and curvature dispersion, and resolution outcomes
+
+    Args:
+        responses: One row per viewed clip (e.g. StarSchema.responses)
+        catalog: Clip catalog order; clips without responses get empty rows
+
+    Returns:
+        pd.DataFrame: Indexed by video_id
+    """
+    trajectories = response_trajectories(responses)
+
+    # Products for the grouped slope-resolution correlation
+    both = trajectories[['slope', 'resolved_tension']].notna().all(axis=1)
+    x = trajectories['slope'].where(both)
+    y = trajectories['resolved_tension'].where(both)
+    metrics = trajectories.drop(columns='video_id').assign(
+        rising=(trajectories['slope'] > 0).astype(np.float64),
+        _x=x, _y=y, _xx=x * x, _yy=y * y, _xy=x * y)
+
+    grouped = metrics.groupby(trajectories['video_id'].astype(str).to_numpy())
+    stats = grouped.agg(['count', 'mean', 'std'])
+    quartiles = grouped[['slope', 'curvature']].quantile([0.25, 0.75]).unstack()
+
+    cov = stats[('_xy', 'mean')] - stats[('_x', 'mean')] * stats[('_y', 'mean')]
+    var_x = stats[('_xx', 'mean')] - stats[('_x', 'mean')] ** 2
+    var_y = stats[('_yy', 'mean')] - stats[('_y', 'mean')] ** 2
+    denominator = np.sqrt(var_x * var_y)
+
+    profiles = pd.DataFrame({
+        'n_responses': stats[('slope', 'count')],
+        'tension_beginning_mean': stats[('tension_beginning', 'mean')],
+        'tension_middle_mean': stats[('tension_middle', 'mean')],
+        'tension_end_mean': stats[('tension_end', 'mean')],
+        'slope_mean': stats[('slope', 'mean')],
+        'slope_std': stats[('slope', 'std')],
+        'slope_iqr': quartiles[('slope', 0.75)] - quartiles[('slope', 0.25)],
+        'curvature_mean': stats[('curvature', 'mean')],
+        'curvature_std': stats[('curvature', 'std')],
+        'curvature_iqr': quartiles[('curvature', 0.75)] - quartiles[('curvature', 0.25)],
+        'rising_share': stats[('rising', 'mean')],
+        'narrative_resolution_rate': stats[('narrative_resolution', 'mean')],
+        'resolved_tension_mean': stats[('resolved_tension', 'mean')],
+        'resolved_tension_std': stats[('resolved_tension', 'std')],
+        'slope_resolved_corr': (cov / denominator.where(denominator > 0)).clip(-1, 1)
+    })
+
+    profiles['shape'] = np.select(
+        [profiles['curvature_mean'] <= -SHAPE_CURVATURE_THRESHOLD,
+         profiles['curvature_mean'] >= SHAPE_CURVATURE_THRESHOLD,
+         profiles['slope_mean'] >= SHAPE_SLOPE_THRESHOLD,
+         profiles['slope_mean'] <= -SHAPE_SLOPE_THRESHOLD],
+        ['peaked', 'dipped', 'rising', 'falling'], default='flat')
+
+    if catalog is not None:
+        profiles = profiles.reindex(list(catalog))
+        profiles['n_responses'] = profiles['n_responses'].fillna(0).astype(int)
+    profiles.index.name = 'video_id'
+
+    logger.info(f"Profiled tension trajectories for {int((profiles['n_responses'] > 0).sum())} clips "
+                f"from {len(trajectories)} responses")
+    return profiles
+
+
+def pooled_trajectory_summary(responses: pd.DataFrame) -> Dict[str, float]:
+    """
+    Pooled trajectory summary across all clips
+    """
+    trajectories = response_trajectories(responses)
+    return {
+        'n_responses': len(trajectories),
+        **{f"{col}_mean": float(trajectories[col].mean()) for col in SLIDER_QUESTIONS},
+        'slope_mean': float(trajectories['slope'].mean()),
+        'slope_std': float(trajectories['slope'].std()),
+        'curvature_mean': float(trajectories['curvature'].mean()),
+        'curvature_std': float(trajectories['curvature'].std()),
+        'rising_share': float((trajectories['slope'] > 0).mean())
+    }
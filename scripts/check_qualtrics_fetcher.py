@@ -0,0 +1,275 @@
+"""
+Stub Server Check for the Qualtrics Export Fetcher
+
+This script runs code/qualtrics_fetcher.py against a local stub of the Qualtrics
+response export API (no network access or API token needed). The stub serves the
+sample export in data/ as a chunked download and checks that:
+1. Survey listing follows nextPage links
+2. Several surveys are exported, polled and streamed into the cleaner concurrently,
+   and the cleaned long format matches a file-based cleaning run
+3. Connections are closed, not pooled, when a download breaks mid-chunk or the
+   consumer stops reading early, and a broken download fails the cleaner
+4. A failing or cancelled survey does not hang the run: surveys still downloading
+   are cancelled and no cleaner thread is left behind
+
+Usage:
+    python scripts/check_qualtrics_fetcher.py
+"""
+
+import asyncio
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / 'code'))
+
+from data_cleaning import VideoNarrativeDataCleaner
+from qualtrics_fetcher import QualtricsExportFetcher
+
+SAMPLE_EXPORT = ROOT / 'data' / 'SML+Narrative+Resolution+-+REP_October+7,+2025_16.56.csv'
+SURVEYS = ['SV_wave1', 'SV_wave2']
+BROKEN_SURVEY = 'SV_broken'
+SLOW_SURVEY = 'SV_slow'
+CHUNK_SIZE = 16 * 1024
+SLOW_CHUNK_DELAY = 0.1
+HANG_TIMEOUT = 20.0
+
+
+class StubExportAPI(BaseHTTPRequestHandler):
+    """
+    Qualtrics-style export endpoints: survey list, export start, progress and file download
+    """
+    protocol_version = 'HTTP/1.1'
+    export = b''
+    polls = {}
+    lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _json(self, payload, status=200):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _chunked_file(self, broken: bool, slow: bool):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/csv')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        for start in range(0, len(self.export), CHUNK_SIZE):
+            chunk = self.export[start:start + CHUNK_SIZE]
+            if broken and start >= 2 * CHUNK_SIZE:
+                # Announce a full chunk, send part of it and drop the connection
+                self.wfile.write(f"{len(chunk):x}\r\n".encode() + chunk[:100])
+                self.wfile.flush()
+                self.close_connection = True
+                return
+            self.wfile.write(f"{len(chunk):x}\r\n".encode() + chunk + b"\r\n")
+            if slow:
+                self.wfile.flush()
+                time.sleep(SLOW_CHUNK_DELAY)
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _route(self):
+        length = int(self.headers.get('Content-Length', 0))
+        if length:
+            self.rfile.read(length)
+
+        parts = self.path.split('?')[0].strip('/').split('/')
+        if self.headers.get('X-API-TOKEN') != 'stub-token':
+            self._json({'error': 'unauthorized'}, 401)
+        elif parts == ['API', 'v3', 'surveys']:
+            if '?page=2' in self.path:
+                self._json({'result': {'elements': [{'id': s} for s in SURVEYS[1:]], 'nextPage': None}})
+            else:
+                next_page = f"http://{self.headers['Host']}/API/v3/surveys?page=2"
+                self._json({'result': {'elements': [{'id': s} for s in SURVEYS[:1]], 'nextPage': next_page}})
+        elif len(parts) == 5 and parts[4] == 'export-responses' and self.command == 'POST':
+            self._json({'result': {'progressId': f"ES_{parts[3]}"}})
+        elif len(parts) == 6 and parts[4] == 'export-responses':
+            with self.lock:
+                self.polls[parts[5]] = self.polls.get(parts[5], 0) + 1
+                first_poll = self.polls[parts[5]] == 1
+            if first_poll:
+                self._json({'result': {'status': 'inProgress', 'percentComplete': 50.0}})
+            else:
+                self._json({'result': {'status': 'complete', 'fileId': f"FILE_{parts[3]}"}})
+        elif len(parts) == 7 and parts[6] == 'file':
+            self._chunked_file(broken=parts[3] == BROKEN_SURVEY, slow=parts[3] == SLOW_SURVEY)
+        else:
+            self._json({'error': f"unknown path {self.path}"}, 404)
+
+    do_GET = _route
+    do_POST = _route
+
+
+class StubServer(ThreadingHTTPServer):
+    """
+    Stub server that ignores clients dropping connections (the checks do this on purpose)
+    """
+
+    def handle_error(self, request, client_address):
+        if not isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            super().handle_error(request, client_address)
+
+
+def check(name: str, passed: bool, results: list):
+    results.append(passed)
+    print(f"{'PASS' if passed else 'FAIL'}: {name}")
+
+
+async def check_connection_handling(fetcher: QualtricsExportFetcher, base_url: str, results: list):
+    """
+    A broken or abandoned body must close its connection instead of returning it to the pool
+    """
+    pool = fetcher._pool
+    file_url = f"{base_url}/API/v3/surveys/{BROKEN_SURVEY}/export-responses/FILE_x/file"
+    headers = {'X-API-TOKEN': 'stub-token'}
+
+    response = await pool.request('GET', file_url, headers)
+    try:
+        await response.read()
+        failed = False
+    except ConnectionError:
+        failed = True
+    check("mid-chunk disconnect raises ConnectionError", failed, results)
+    check("broken connection is closed, not pooled",
+          response._writer.is_closing() and not any(pool._idle.values()), results)
+
+    file_url = f"{base_url}/API/v3/surveys/{SURVEYS[0]}/export-responses/FILE_x/file"
+    response = await pool.request('GET', file_url, headers)
+    chunks = response.iter_chunks()
+    async for _ in chunks:
+        break
+    await chunks.aclose()
+    check("connection abandoned after the first chunk is closed, not pooled",
+          response._writer.is_closing() and not any(pool._idle.values()), results)
+
+    response = await pool.request('GET', file_url, headers)
+    body = await response.read()
+    check("fully read download is returned to the pool",
+          len(body) == len(StubExportAPI.export) and any(pool._idle.values()), results)
+
+
+def _run_with_timeout(coro_factory) -> dict:
+    """
+    asyncio.run a coroutine in a daemon thread so a hang fails the check instead of the script
+    """
+    outcome = {}
+
+    def target():
+        try:
+            outcome['result'] = asyncio.run(coro_factory())
+        except BaseException as e:
+            outcome['error'] = e
+
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    thread.join(HANG_TIMEOUT)
+    outcome['returned'] = not thread.is_alive()
+    return outcome
+
+
+def _cleaner_threads() -> list:
+    return [t for t in threading.enumerate() if t.name.startswith('asyncio_')]
+
+
+def check_failure_handling(base_url: str, output_dir: Path, results: list):
+    """
+    A failing or cancelled survey must not leave a sibling download or its cleaner thread running
+    """
+    def fetcher():
+        return QualtricsExportFetcher('stub-token', base_url, str(output_dir), max_concurrent=2, poll_interval=0.05)
+
+    async def cancel_mid_download():
+        task = asyncio.create_task(fetcher().fetch_survey(SLOW_SURVEY))
+        await asyncio.sleep(10 * SLOW_CHUNK_DELAY)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        return task.cancelled()
+
+    outcome = _run_with_timeout(cancel_mid_download)
+    check("cancelling a survey mid-download returns",
+          outcome['returned'] and outcome.get('result') is True, results)
+
+    # Both exports are ready on the first poll now, so the slow survey is mid-download when the other breaks
+    outcome = _run_with_timeout(lambda: fetcher().run([SLOW_SURVEY, BROKEN_SURVEY]))
+    check("run returns when one survey fails while another is downloading",
+          outcome['returned'] and isinstance(outcome.get('error'), ConnectionError), results)
+    check("cancelled sibling saves no cleaned output",
+          not any(output_dir.glob(f"{SLOW_SURVEY}_cleaned_*")), results)
+    check("no cleaner threads left running", not _cleaner_threads(), results)
+
+
+async def run_checks(base_url: str, output_dir: Path, results: list):
+    fetcher = QualtricsExportFetcher('stub-token', base_url, str(output_dir), max_concurrent=2, poll_interval=0.05)
+
+    surveys = await fetcher.list_surveys()
+    check("survey listing follows nextPage", [s['id'] for s in surveys] == SURVEYS, results)
+
+    saved = await fetcher.fetch_surveys(SURVEYS)
+    check("concurrent surveys cleaned", set(saved) == set(SURVEYS), results)
+
+    try:
+        await fetcher.fetch_survey(BROKEN_SURVEY)
+        broken_failed = False
+    except Exception:
+        broken_failed = True
+    check("broken download fails the cleaner", broken_failed, results)
+    check("no cleaned output saved for the broken download",
+          not any(output_dir.glob(f"{BROKEN_SURVEY}_cleaned_*")), results)
+
+    await check_connection_handling(fetcher, base_url, results)
+    fetcher._pool.close()
+    return saved
+
+
+def main():
+    """
+    Run the fetcher against the stub server and report each check
+    """
+    # The broken download logs expected cleaner errors
+    logging.disable(logging.CRITICAL)
+    StubExportAPI.export = SAMPLE_EXPORT.read_bytes()
+    server = StubServer(('127.0.0.1', 0), StubExportAPI)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    results = []
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            output_dir = Path(tmp)
+            saved = asyncio.run(run_checks(base_url, output_dir, results))
+            check_failure_handling(base_url, output_dir, results)
+
+            reference_dir = output_dir / 'reference'
+            VideoNarrativeDataCleaner(str(SAMPLE_EXPORT), str(reference_dir)).run_full_pipeline('reference')
+            reference = (reference_dir / 'reference_long_format.csv').read_bytes()
+            for survey_id in SURVEYS:
+                streamed = Path(saved[survey_id]['long_format']).read_bytes()
+                check(f"{survey_id} long format matches the file-based run", streamed == reference, results)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    print(f"\n{sum(results)}/{len(results)} checks passed")
+    if _cleaner_threads():
+        # A stuck cleaner thread would block interpreter exit; report and leave instead
+        sys.stdout.flush()
+        os._exit(1)
+    return 0 if all(results) else 1
+
+
+if __name__ == "__main__":
+    exit(main())